@@ -2,8 +2,13 @@ from __future__ import annotations
 
 import os
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Set
+from typing import FrozenSet, Set, Tuple
+
+
+_DEFAULT_MODELS = ("gpt-4o-mini", "gpt-4.1-mini", "gpt-4.1", "gpt-5-mini", "gpt-5", "gpt-5.2")
+_DEFAULT_NEVER_RECONCILE = ("PII", "SECRET", "FINANCIAL")
 
 
 def _as_bool(value: str | None, default: bool) -> bool:
@@ -21,12 +26,13 @@ def _as_int(value: str | None, default: int) -> int:
         return default
 
 
-def _as_list(value: str | None, default: List[str]) -> List[str]:
+def _as_list(value: str | None, default: Tuple[str, ...]) -> Tuple[str, ...]:
     if value is None or not value.strip():
         return default
-    return [item.strip() for item in value.split(",") if item.strip()]
+    return tuple(item.strip() for item in value.split(",") if item.strip())
 
 
+@lru_cache(maxsize=1)
 def _is_vercel_runtime() -> bool:
     return os.getenv("VERCEL") == "1" or bool(os.getenv("VERCEL_ENV"))
 
@@ -41,7 +47,8 @@ class Settings:
     db_path: Path
     max_upload_mb: int
     logging_enabled: bool
-    available_models: List[str]
+    available_models: Tuple[str, ...]
+    allowed_models: FrozenSet[str]
     default_model: str
     openai_api_key: str
     openai_base_url: str
@@ -51,24 +58,24 @@ class Settings:
 
 
 def load_settings(base_dir: Path | None = None) -> Settings:
-    root = base_dir or Path.cwd()
+    root = (base_dir or Path.cwd()).resolve()
     default_data_dir = Path("/tmp/gpt-cleaner-data") if _is_vercel_runtime() else (root / "data")
-    data_dir = Path(os.getenv("DATA_DIR", str(default_data_dir)))
-    rules_dir = Path(os.getenv("RULES_DIR", str(root / "rules")))
-    uploads_dir = Path(os.getenv("UPLOADS_DIR", str(data_dir / "uploads")))
-    db_path = Path(os.getenv("DB_PATH", str(data_dir / "app.db")))
-    ruleset_file = Path(os.getenv("RULESET_FILE", str(rules_dir / "ruleset.yaml")))
+    data_dir = Path(os.getenv("DATA_DIR", str(default_data_dir))).resolve()
+    rules_dir = Path(os.getenv("RULES_DIR", str(root / "rules"))).resolve()
+    uploads_dir = Path(os.getenv("UPLOADS_DIR", str(data_dir / "uploads"))).resolve()
+    db_path = Path(os.getenv("DB_PATH", str(data_dir / "app.db"))).resolve()
+    ruleset_file = Path(os.getenv("RULESET_FILE", str(rules_dir / "ruleset.yaml"))).resolve()
 
     models = _as_list(
         os.getenv("AVAILABLE_MODELS"),
-        ["gpt-4o-mini", "gpt-4.1-mini", "gpt-4.1", "gpt-5-mini", "gpt-5", "gpt-5.2"],
+        _DEFAULT_MODELS,
     )
     default_model = os.getenv("DEFAULT_MODEL", models[0])
 
     never_reconcile = set(
         _as_list(
             os.getenv("NEVER_RECONCILE_CATEGORIES"),
-            ["PII", "SECRET", "FINANCIAL"],
+            _DEFAULT_NEVER_RECONCILE,
         )
     )
 
@@ -82,6 +89,7 @@ def load_settings(base_dir: Path | None = None) -> Settings:
         max_upload_mb=_as_int(os.getenv("MAX_UPLOAD_MB"), 20),
         logging_enabled=_as_bool(os.getenv("LOGGING_ENABLED"), False),
         available_models=models,
+        allowed_models=frozenset(models),
         default_model=default_model,
         openai_api_key=os.getenv("OPENAI_API_KEY", ""),
         openai_base_url=os.getenv("OPENAI_BASE_URL", ""),
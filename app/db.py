@@ -1,30 +1,94 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import queue
 import sqlite3
 import threading
+import uuid
+from contextlib import contextmanager
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+_CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+)
+
+SCHEMA_VERSION = 2
+JSONB_SUPPORTED = sqlite3.sqlite_version_info >= (3, 45, 0)
+_STATEMENT_CACHE_SIZE = 256
+
+
+def json_param(placeholder: str = "?") -> str:
+    return f"jsonb({placeholder})" if JSONB_SUPPORTED else placeholder
+
+
+# json() also accepts TEXT JSON, so rows written before an upgrade to JSONB storage read back unchanged.
+def json_column(column: str) -> str:
+    return f"json({column}) AS {column}" if JSONB_SUPPORTED else column
 
 
 def now_utc() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
+def new_id() -> str:
+    return uuid.uuid4().hex
+
+
 @dataclass(slots=True)
 class Database:
     path: Path
-    _lock: threading.Lock = field(init=False, repr=False)
+    reader_pool_size: int = 4
+    _lock: threading.RLock = field(init=False, repr=False)
+    _local: threading.local = field(init=False, repr=False)
     _conn: sqlite3.Connection = field(init=False, repr=False)
+    _readers: queue.Queue[sqlite3.Connection] = field(init=False, repr=False)
 
     def __post_init__(self) -> None:
         self.path.parent.mkdir(parents=True, exist_ok=True)
-        self._lock = threading.Lock()
-        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
-        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._conn = self._connect()
         self._init_schema()
+        self._readers = queue.Queue(maxsize=self.reader_pool_size)
+        for _ in range(self.reader_pool_size):
+            self._readers.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            str(self.path),
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=_STATEMENT_CACHE_SIZE,
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in _CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        if getattr(self._local, "in_transaction", False):
+            yield self._conn
+            return
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
 
     def _init_schema(self) -> None:
         schema = """
@@ -46,6 +110,9 @@ class Database:
             FOREIGN KEY(session_id) REFERENCES chat_sessions(id)
         );
 
+        CREATE INDEX IF NOT EXISTS idx_chat_messages_session_created
+            ON chat_messages(session_id, created_at);
+
         CREATE TABLE IF NOT EXISTS uploaded_files (
             id TEXT PRIMARY KEY,
             filename TEXT NOT NULL,
@@ -83,32 +150,73 @@ class Database:
         );
         """
         with self._lock:
-            self._conn.executescript(schema)
-            self._conn.commit()
+            current_version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            if current_version >= SCHEMA_VERSION:
+                return
+            self._conn.executescript(
+                f"BEGIN IMMEDIATE;\n{schema}\nPRAGMA user_version = {SCHEMA_VERSION};\nCOMMIT;"
+            )
 
     def close(self) -> None:
         with self._lock:
             self._conn.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        with self._lock:
+            if getattr(self._local, "in_transaction", False):
+                yield
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._local.in_transaction = True
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            else:
+                try:
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    if self._conn.in_transaction:
+                        self._conn.execute("ROLLBACK")
+                    raise
+            finally:
+                self._local.in_transaction = False
 
     def execute(self, query: str, params: tuple[Any, ...] = ()) -> None:
         with self._lock:
             self._conn.execute(query, params)
-            self._conn.commit()
+
+    def execute_many(self, query: str, params_seq: Iterable[tuple[Any, ...]]) -> None:
+        with self.transaction():
+            self._conn.executemany(query, params_seq)
 
     def fetchone(self, query: str, params: tuple[Any, ...] = ()) -> Optional[Dict[str, Any]]:
-        with self._lock:
-            row = self._conn.execute(query, params).fetchone()
+        with self._reader() as conn:
+            row = conn.execute(query, params).fetchone()
         if row is None:
             return None
         return dict(row)
 
     def fetchall(self, query: str, params: tuple[Any, ...] = ()) -> List[Dict[str, Any]]:
-        with self._lock:
-            rows = self._conn.execute(query, params).fetchall()
+        with self._reader() as conn:
+            rows = conn.execute(query, params).fetchall()
         return [dict(item) for item in rows]
 
+    def fetchall_rows(self, query: str, params: tuple[Any, ...] = ()) -> List[sqlite3.Row]:
+        with self._reader() as conn:
+            return conn.execute(query, params).fetchall()
+
+    async def execute_async(self, query: str, params: tuple[Any, ...] = ()) -> None:
+        await asyncio.to_thread(self.execute, query, params)
+
     @staticmethod
     def to_json(value: Any) -> str:
+        if orjson is not None:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
         return json.dumps(value, ensure_ascii=True)
 
     @staticmethod
@@ -116,6 +224,8 @@ class Database:
         if not value:
             return default
         try:
+            if orjson is not None:
+                return orjson.loads(value)
             return json.loads(value)
         except json.JSONDecodeError:
             return default
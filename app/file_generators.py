@@ -1,10 +1,10 @@
 from __future__ import annotations
 
 import csv
-import textwrap
 from dataclasses import dataclass
+from functools import cache
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Optional
 
 
 MIME_BY_EXTENSION = {
@@ -18,6 +18,8 @@ MIME_BY_EXTENSION = {
 
 SUPPORTED_OUTPUT_EXTENSIONS = {".txt", ".md", ".csv", ".docx", ".xlsx"}
 
+_CSV_LINE_TERMINATOR = "\r\n"
+
 
 @dataclass(slots=True)
 class GeneratedFile:
@@ -27,6 +29,74 @@ class GeneratedFile:
     warning: Optional[str] = None
 
 
+@cache
+def _docx_document() -> Any:
+    from docx import Document  # type: ignore
+
+    return Document
+
+
+@cache
+def _xlsx_workbook() -> Any:
+    from openpyxl import Workbook  # type: ignore
+
+    return Workbook
+
+
+def _csv_lines_need_quoting(content: str, lines: list[str]) -> bool:
+    if "," in content or '"' in content:
+        return True
+    return not all(lines)
+
+
+def _write_text(destination: Path, content: str) -> None:
+    destination.write_text(content, encoding="utf-8")
+
+
+def _write_csv(destination: Path, content: str) -> None:
+    lines = content.splitlines()
+    with destination.open("w", encoding="utf-8", newline="") as handle:
+        if _csv_lines_need_quoting(content, lines):
+            csv.writer(handle).writerows([line] for line in lines)
+        elif lines:
+            handle.write(_CSV_LINE_TERMINATOR.join(lines))
+            handle.write(_CSV_LINE_TERMINATOR)
+
+
+def _write_docx(destination: Path, content: str) -> None:
+    try:
+        Document = _docx_document()
+    except ImportError as exc:  # pragma: no cover
+        raise RuntimeError("python-docx is not installed") from exc
+    document = Document()
+    for line in content.splitlines() or [""]:
+        document.add_paragraph(line)
+    document.save(str(destination))
+
+
+def _write_xlsx(destination: Path, content: str) -> None:
+    try:
+        Workbook = _xlsx_workbook()
+    except ImportError as exc:  # pragma: no cover
+        raise RuntimeError("openpyxl is not installed") from exc
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Response"
+    lines = content.splitlines() or [content]
+    for idx, line in enumerate(lines, start=1):
+        sheet.cell(row=idx, column=1, value=line)
+    workbook.save(str(destination))
+
+
+_WRITERS: dict[str, Callable[[Path, str], None]] = {
+    ".txt": _write_text,
+    ".md": _write_text,
+    ".csv": _write_csv,
+    ".docx": _write_docx,
+    ".xlsx": _write_xlsx,
+}
+
+
 def generate_response_file(
     output_dir: Path,
     source_filename: str,
@@ -53,65 +123,11 @@ def generate_response_file(
     output_name = f"{stem}_response{suffix}"
     destination = output_dir / f"{file_id}{suffix}"
 
-    if suffix == ".txt":
-        destination.write_text(content, encoding="utf-8")
-    elif suffix == ".md":
-        destination.write_text(content, encoding="utf-8")
-    elif suffix == ".csv":
-        with destination.open("w", encoding="utf-8", newline="") as handle:
-            writer = csv.writer(handle)
-            for line in content.splitlines():
-                writer.writerow([line])
-    elif suffix == ".docx":
-        try:
-            from docx import Document  # type: ignore
-        except ImportError as exc:  # pragma: no cover
-            raise RuntimeError("python-docx is not installed") from exc
-        document = Document()
-        for line in content.splitlines() or [""]:
-            document.add_paragraph(line)
-        document.save(str(destination))
-    elif suffix == ".xlsx":
-        try:
-            from openpyxl import Workbook  # type: ignore
-        except ImportError as exc:  # pragma: no cover
-            raise RuntimeError("openpyxl is not installed") from exc
-        workbook = Workbook()
-        sheet = workbook.active
-        sheet.title = "Response"
-        lines = content.splitlines() or [content]
-        for idx, line in enumerate(lines, start=1):
-            sheet.cell(row=idx, column=1, value=line)
-        workbook.save(str(destination))
-    elif suffix == ".pdf":
-        try:
-            from reportlab.lib.pagesizes import A4  # type: ignore
-            from reportlab.pdfgen import canvas  # type: ignore
-        except ImportError:
-            destination = output_dir / f"{file_id}.txt"
-            output_name = f"{stem}_response.txt"
-            suffix = ".txt"
-            warning = "reportlab is not available: fallback to .txt"
-            destination.write_text(content, encoding="utf-8")
-        else:
-            pdf = canvas.Canvas(str(destination), pagesize=A4)
-            width, height = A4
-            y = height - 40
-            for raw_line in content.splitlines() or [""]:
-                wrapped = textwrap.wrap(raw_line, width=110) or [""]
-                for line in wrapped:
-                    pdf.drawString(40, y, line)
-                    y -= 14
-                    if y < 40:
-                        pdf.showPage()
-                        y = height - 40
-            pdf.save()
-    else:  # pragma: no cover
-        destination.write_text(content, encoding="utf-8")
+    _WRITERS.get(suffix, _write_text)(destination, content)
 
     return GeneratedFile(
         filename=output_name,
-        content_type=MIME_BY_EXTENSION.get(suffix, "text/plain"),
+        content_type=MIME_BY_EXTENSION.get(suffix, "application/octet-stream"),
         path=destination,
         warning=warning,
     )
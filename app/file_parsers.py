@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 import csv
+import io
+from functools import cache
 from pathlib import Path
-from typing import Iterable
+from typing import Any, Callable
 
 
 ALLOWED_EXTENSIONS = {".txt", ".md", ".docx", ".pdf", ".xlsx", ".csv"}
+_NULL_TABLE = str.maketrans("", "", "\x00")
 
 
 class FileParseError(Exception):
@@ -13,7 +16,30 @@ class FileParseError(Exception):
 
 
 def _normalize_text(value: str) -> str:
-    return value.replace("\x00", "").strip()
+    if "\x00" in value:
+        value = value.translate(_NULL_TABLE)
+    return value.strip()
+
+
+@cache
+def _docx_document() -> Any:
+    from docx import Document  # type: ignore
+
+    return Document
+
+
+@cache
+def _pdf_reader() -> Any:
+    from pypdf import PdfReader  # type: ignore
+
+    return PdfReader
+
+
+@cache
+def _xlsx_load_workbook() -> Any:
+    from openpyxl import load_workbook  # type: ignore
+
+    return load_workbook
 
 
 def _read_text_file(path: Path) -> str:
@@ -21,56 +47,82 @@ def _read_text_file(path: Path) -> str:
 
 
 def _read_csv(path: Path) -> str:
-    lines: list[str] = []
+    buffer = io.StringIO()
+    separator = ""
     with path.open("r", encoding="utf-8", errors="ignore", newline="") as handle:
         reader = csv.reader(handle)
         for row in reader:
-            lines.append("\t".join(item.strip() for item in row))
-    return "\n".join(lines)
+            buffer.write(separator)
+            buffer.write("\t".join(item.strip() for item in row))
+            separator = "\n"
+    return buffer.getvalue()
 
 
 def _read_docx(path: Path) -> str:
     try:
-        from docx import Document  # type: ignore
+        Document = _docx_document()
     except ImportError as exc:  # pragma: no cover
         raise FileParseError("python-docx is not installed") from exc
 
     document = Document(str(path))
-    chunks = [paragraph.text for paragraph in document.paragraphs if paragraph.text.strip()]
-    return "\n".join(chunks)
+    buffer = io.StringIO()
+    separator = ""
+    for paragraph in document.paragraphs:
+        text = paragraph.text
+        if text.strip():
+            buffer.write(separator)
+            buffer.write(text)
+            separator = "\n"
+    return buffer.getvalue()
 
 
 def _read_pdf(path: Path) -> str:
     try:
-        from pypdf import PdfReader  # type: ignore
+        PdfReader = _pdf_reader()
     except ImportError as exc:  # pragma: no cover
         raise FileParseError("pypdf is not installed") from exc
 
     reader = PdfReader(str(path))
-    chunks: list[str] = []
+    buffer = io.StringIO()
+    separator = ""
     for page in reader.pages:
         text = page.extract_text() or ""
         if text.strip():
-            chunks.append(text)
-    return "\n".join(chunks)
+            buffer.write(separator)
+            buffer.write(text)
+            separator = "\n"
+    return buffer.getvalue()
 
 
 def _read_xlsx(path: Path) -> str:
     try:
-        from openpyxl import load_workbook  # type: ignore
+        load_workbook = _xlsx_load_workbook()
     except ImportError as exc:  # pragma: no cover
         raise FileParseError("openpyxl is not installed") from exc
 
     workbook = load_workbook(str(path), read_only=True, data_only=True)
-    chunks: list[str] = []
+    buffer = io.StringIO()
+    separator = ""
     for sheet in workbook.worksheets:
-        chunks.append(f"# Sheet: {sheet.title}")
+        buffer.write(separator)
+        buffer.write(f"# Sheet: {sheet.title}")
+        separator = "\n"
         for row in sheet.iter_rows(values_only=True):
-            values = ["" if item is None else str(item) for item in row]
-            line = "\t".join(value.strip() for value in values if value is not None)
+            line = "\t".join("" if item is None else str(item).strip() for item in row)
             if line.strip():
-                chunks.append(line)
-    return "\n".join(chunks)
+                buffer.write("\n")
+                buffer.write(line)
+    return buffer.getvalue()
+
+
+_READERS: dict[str, Callable[[Path], str]] = {
+    ".txt": _read_text_file,
+    ".md": _read_text_file,
+    ".csv": _read_csv,
+    ".docx": _read_docx,
+    ".pdf": _read_pdf,
+    ".xlsx": _read_xlsx,
+}
 
 
 def parse_file(path: Path) -> str:
@@ -78,18 +130,10 @@ def parse_file(path: Path) -> str:
     if suffix not in ALLOWED_EXTENSIONS:
         raise FileParseError(f"Unsupported format: {suffix}")
 
-    if suffix in {".txt", ".md"}:
-        text = _read_text_file(path)
-    elif suffix == ".csv":
-        text = _read_csv(path)
-    elif suffix == ".docx":
-        text = _read_docx(path)
-    elif suffix == ".pdf":
-        text = _read_pdf(path)
-    elif suffix == ".xlsx":
-        text = _read_xlsx(path)
-    else:  # pragma: no cover
+    reader = _READERS.get(suffix)
+    if reader is None:  # pragma: no cover
         raise FileParseError(f"Unhandled format: {suffix}")
+    text = reader(path)
 
     normalized = _normalize_text(text)
     if not normalized:
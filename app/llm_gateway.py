@@ -1,10 +1,21 @@
 from __future__ import annotations
 
+from functools import lru_cache
 from typing import Any, Dict, List, Tuple
 
 from .config import Settings
 
 
+@lru_cache(maxsize=4)
+def _build_client(api_key: str, base_url: str) -> Any:
+    from openai import OpenAI  # type: ignore
+
+    kwargs: Dict[str, Any] = {"api_key": api_key}
+    if base_url:
+        kwargs["base_url"] = base_url
+    return OpenAI(**kwargs)
+
+
 class LLMGatewayError(Exception):
     def __init__(self, message: str, upstream_status: int | None = None) -> None:
         super().__init__(message)
@@ -15,45 +26,34 @@ class LLMGatewayError(Exception):
 class LLMGateway:
     def __init__(self, settings: Settings) -> None:
         self._settings = settings
-        self._client = None
-        if settings.openai_api_key:
-            try:
-                from openai import OpenAI  # type: ignore
+        self._client: Any = None
+        self._client_resolved = not settings.openai_api_key
+
+    def resolve_client(self) -> None:
+        self._get_client()
 
-                kwargs: Dict[str, Any] = {"api_key": settings.openai_api_key}
-                if settings.openai_base_url:
-                    kwargs["base_url"] = settings.openai_base_url
-                self._client = OpenAI(**kwargs)
+    def _get_client(self) -> Any:
+        if not self._client_resolved:
+            try:
+                self._client = _build_client(self._settings.openai_api_key, self._settings.openai_base_url)
             except Exception:
                 self._client = None
+            self._client_resolved = True
+        return self._client
 
     @property
     def is_mock_mode(self) -> bool:
-        return self._client is None
+        return self._get_client() is None
 
     def chat(self, messages: List[Dict[str, str]], model: str) -> Tuple[str, Dict[str, Any]]:
-        if self._client is None:
-            last_user = ""
-            for item in reversed(messages):
-                if item.get("role") == "user":
-                    last_user = item.get("content", "")
-                    break
-            text = (
-                "[MOCK MODE] Simulated response. "
-                "No OPENAI_API_KEY configured. "
-                f"Last received prompt: {last_user[:400]}"
-            )
-            return text, {"provider": "mock", "completion_tokens": 0, "prompt_tokens": 0}
+        client = self._get_client()
+        if client is None:
+            return self._mock_text(messages), {"provider": "mock", "completion_tokens": 0, "prompt_tokens": 0}
 
         try:
-            response = self._client.chat.completions.create(model=model, messages=messages)
+            response = client.chat.completions.create(model=model, messages=messages)
         except Exception as exc:
-            upstream_status = getattr(exc, "status_code", None)
-            if upstream_status is None:
-                response = getattr(exc, "response", None)
-                upstream_status = getattr(response, "status_code", None)
-            message = str(exc) or "Unknown provider error"
-            raise LLMGatewayError(message=message, upstream_status=upstream_status) from exc
+            raise self._to_gateway_error(exc) from exc
 
         content = response.choices[0].message.content or ""
 
@@ -67,3 +67,25 @@ class LLMGateway:
                 }
             )
         return content, usage
+
+    @staticmethod
+    def _mock_text(messages: List[Dict[str, str]]) -> str:
+        last_user = ""
+        for item in reversed(messages):
+            if item.get("role") == "user":
+                last_user = item.get("content", "")
+                break
+        return (
+            "[MOCK MODE] Simulated response. "
+            "No OPENAI_API_KEY configured. "
+            f"Last received prompt: {last_user[:400]}"
+        )
+
+    @staticmethod
+    def _to_gateway_error(exc: Exception) -> LLMGatewayError:
+        upstream_status = getattr(exc, "status_code", None)
+        if upstream_status is None:
+            response = getattr(exc, "response", None)
+            upstream_status = getattr(response, "status_code", None)
+        message = str(exc) or "Unknown provider error"
+        return LLMGatewayError(message=message, upstream_status=upstream_status)
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
-import json
+import asyncio
+import os
 import re
-import uuid
+import shutil
+import sqlite3
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any, Dict, List
+from types import MappingProxyType
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 from fastapi import FastAPI, File, HTTPException, Query, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
@@ -12,7 +16,7 @@ from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 
 from .config import Settings, load_settings
-from .db import Database, now_utc
+from .db import Database, json_column, json_param, new_id, now_utc
 from .file_generators import generate_response_file
 from .file_parsers import FileParseError, ensure_allowed_filename, parse_file
 from .llm_gateway import LLMGateway, LLMGatewayError
@@ -34,111 +38,161 @@ from .version import APP_VERSION
 
 
 def _resolve_file_id(rules_dir: Path, file_id: str) -> Path:
-    base = rules_dir.resolve()
-    candidate = (base / file_id).resolve()
+    candidate = (rules_dir / file_id).resolve()
     try:
-        candidate.relative_to(base)
+        candidate.relative_to(rules_dir)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid file path")
     return candidate
 
 
-def _to_message_response(row: Dict[str, Any]) -> MessageResponse:
-    metadata = Database.from_json(row.get("metadata_json"), {})
+def _to_message_response(row: sqlite3.Row) -> MessageResponse:
+    metadata = Database.from_json(row["metadata_json"], {})
     display_content = row["content"]
     return MessageResponse(
         id=row["id"],
         role=row["role"],
         content=display_content,
         created_at=row["created_at"],
-        model=row.get("model"),
+        model=row["model"],
         metadata=metadata,
     )
 
 
-_TITLE_STOPWORDS = {
-    "a",
-    "an",
-    "and",
-    "at",
-    "by",
-    "for",
-    "from",
-    "in",
-    "into",
-    "is",
-    "of",
-    "on",
-    "or",
-    "that",
-    "the",
-    "this",
-    "to",
-    "with",
-}
+_TITLE_STOPWORDS = frozenset(
+    {
+        "a",
+        "an",
+        "and",
+        "at",
+        "by",
+        "for",
+        "from",
+        "in",
+        "into",
+        "is",
+        "of",
+        "on",
+        "or",
+        "that",
+        "the",
+        "this",
+        "to",
+        "with",
+    }
+)
+
+_TITLE_TOKEN_RE = re.compile(r"[A-Za-z0-9À-ÖØ-öø-ÿ]+")
+
 
 def _is_default_session_title(title: str) -> bool:
     normalized = (title or "").strip().casefold()
     return normalized in {"", "new chat"}
 
 
-_FORCED_OUTPUT_EXTENSIONS = {
-    "txt": ".txt",
-    "md": ".md",
-    "csv": ".csv",
-    "docx": ".docx",
-    "xlsx": ".xlsx",
-}
+_FORCED_OUTPUT_EXTENSIONS = MappingProxyType(
+    {
+        "txt": ".txt",
+        "md": ".md",
+        "csv": ".csv",
+        "docx": ".docx",
+        "xlsx": ".xlsx",
+    }
+)
 
 _TOKEN_PLACEHOLDER_PATTERN = re.compile(r"<TKN_[A-Z0-9_]+_[0-9]{3}>")
 
-
-def _resolve_output_extension(response_mode: str, source_filename: str) -> tuple[str | None, str | None]:
+_SELECT_SESSION_FOR_TURN_SQL = """
+SELECT cs.id, cs.title,
+       EXISTS(SELECT 1 FROM chat_messages WHERE session_id = cs.id AND role = 'user') AS has_user_turn
+FROM chat_sessions cs
+WHERE cs.id = ?
+"""
+
+_INSERT_MESSAGE_SQL = """
+INSERT INTO chat_messages (id, session_id, role, content, sanitized_content, model, created_at, metadata_json)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_INSERT_UPLOADED_FILE_SQL = """
+INSERT INTO uploaded_files (id, filename, content_type, path, extracted_text, created_at)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+_INSERT_AUDIT_EVENT_SQL = f"""
+INSERT INTO audit_events (
+    id, created_at, session_id, message_id, correlation_id,
+    rules_triggered_json, transformations, tokens_created, tokens_reconciled,
+    original_hash, details_json
+) VALUES (?, ?, ?, ?, ?, {json_param()}, ?, ?, ?, ?, {json_param()})
+"""
+
+_SELECT_AUDIT_EVENT_SQL = f"""
+SELECT
+    id, created_at, session_id, message_id, correlation_id,
+    {json_column("rules_triggered_json")}, transformations, tokens_created, tokens_reconciled,
+    original_hash, {json_column("details_json")}
+FROM audit_events
+WHERE id = ?
+"""
+
+
+def _resolve_output_extension(
+    response_mode: str,
+    source_filename: str,
+    has_attachments: bool,
+) -> tuple[str, str | None, str | None]:
     if response_mode == "chat":
-        return None, None
-    if response_mode in _FORCED_OUTPUT_EXTENSIONS:
-        return _FORCED_OUTPUT_EXTENSIONS[response_mode], None
+        return response_mode, None, None
+    forced_extension = _FORCED_OUTPUT_EXTENSIONS.get(response_mode)
+    if forced_extension is not None:
+        if not has_attachments:
+            return "chat", None, None
+        return response_mode, forced_extension, None
     if response_mode == "same_as_input":
+        if not has_attachments:
+            return "chat", None, None
         suffix = Path(source_filename).suffix.lower()
         if suffix == ".pdf":
-            return ".txt", "PDF output is not supported: fallback to .txt"
+            return response_mode, ".txt", "PDF output is not supported: fallback to .txt"
         if suffix in {".txt", ".md", ".csv", ".docx", ".xlsx"}:
-            return suffix, None
-        return ".txt", "Input format is not supported for output: fallback to .txt"
-    return None, None
+            return response_mode, suffix, None
+        return response_mode, ".txt", "Input format is not supported for output: fallback to .txt"
+    return response_mode, None, None
 
 
-def _build_output_format_instruction(extension: str) -> str:
-    if extension == ".txt":
-        return (
+_OUTPUT_FORMAT_INSTRUCTIONS = MappingProxyType(
+    {
+        ".txt": (
             "Required output format: TXT. Return plain text only, without markdown, "
             "without code blocks, and without introductory text."
-        )
-    if extension == ".md":
-        return (
+        ),
+        ".md": (
             "Required output format: Markdown (.md). Return only the final Markdown document, "
             "without additional introductions."
-        )
-    if extension == ".csv":
-        return (
+        ),
+        ".csv": (
             "Required output format: CSV. Return only valid CSV rows using comma separator, "
             "without comments and without markdown."
-        )
-    if extension == ".docx":
-        return (
+        ),
+        ".docx": (
             "Required output format: structured textual document for DOCX. "
             "Return only final clean content with headings and paragraphs."
-        )
-    if extension == ".xlsx":
-        return (
+        ),
+        ".xlsx": (
             "Required output format: tabular content for XLSX. Return structured rows, "
             "one row per record, without markdown."
-        )
-    return "Required output format: plain text."
+        ),
+    }
+)
+
+
+def _build_output_format_instruction(extension: str) -> str:
+    return _OUTPUT_FORMAT_INSTRUCTIONS.get(extension, "Required output format: plain text.")
 
 
 def _build_session_title_from_prompt(prompt: str) -> str:
-    tokens = re.findall(r"[A-Za-z0-9À-ÖØ-öø-ÿ]+", prompt or "")
+    tokens = _TITLE_TOKEN_RE.findall(prompt or "")
     keywords: list[str] = []
     seen: set[str] = set()
 
@@ -157,6 +211,69 @@ def _build_session_title_from_prompt(prompt: str) -> str:
     return " - ".join(keywords)
 
 
+def _materialize_generated_file(
+    uploads_dir: Path,
+    source_row: sqlite3.Row,
+    content: str,
+    output_extension: str,
+    response_mode: str,
+    mode_warning: str | None,
+) -> tuple[GeneratedFileResponse, str | None, tuple[Any, ...]]:
+    generated_file_id = new_id()
+    generated = generate_response_file(
+        output_dir=uploads_dir,
+        source_filename=source_row["filename"],
+        content=content,
+        file_id=generated_file_id,
+        output_extension=output_extension,
+    )
+    warnings = [warning for warning in [mode_warning, generated.warning] if warning]
+    try:
+        size = os.path.getsize(generated.path)
+    except OSError:
+        size = 0
+    payload = GeneratedFileResponse(
+        id=generated_file_id,
+        filename=generated.filename,
+        content_type=generated.content_type,
+        size=size,
+        download_url=f"/api/files/{generated_file_id}/download",
+        source_file_id=source_row["id"],
+        mode=response_mode,
+    )
+    row = (
+        generated_file_id,
+        generated.filename,
+        generated.content_type,
+        str(generated.path),
+        content,
+        now_utc(),
+    )
+    return payload, "; ".join(warnings) if warnings else None, row
+
+
+_UPLOAD_CHUNK_SIZE = 1 << 20
+_PARTIAL_SUFFIX = ".part"
+
+
+async def _stream_upload(file: UploadFile, destination: Path, max_upload_mb: Optional[int] = None) -> int:
+    max_bytes = None if max_upload_mb is None else max_upload_mb * 1024 * 1024
+    size = 0
+    handle = await asyncio.to_thread(destination.open, "wb")
+    try:
+        while chunk := await file.read(_UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise HTTPException(status_code=400, detail=f"File exceeds {max_upload_mb}MB limit")
+            await asyncio.to_thread(handle.write, chunk)
+    except BaseException:
+        handle.close()
+        destination.unlink(missing_ok=True)
+        raise
+    await asyncio.to_thread(handle.close)
+    return size
+
+
 def _map_llm_error(exc: LLMGatewayError, model: str) -> HTTPException:
     upstream = exc.upstream_status
     detail = f"LLM provider error for model '{model}'"
@@ -172,6 +289,9 @@ def _map_llm_error(exc: LLMGatewayError, model: str) -> HTTPException:
     return HTTPException(status_code=502, detail=detail)
 
 
+_DEFAULTS_DIR = Path(__file__).resolve().parent / "defaults"
+
+
 def _ensure_default_rules(settings: Settings) -> None:
     clients_path = settings.rules_dir / "lists" / "clients.txt"
     if settings.ruleset_file.exists() and clients_path.exists():
@@ -181,55 +301,10 @@ def _ensure_default_rules(settings: Settings) -> None:
     clients_path.parent.mkdir(parents=True, exist_ok=True)
 
     if not settings.ruleset_file.exists():
-        default_rules = {
-            "version": 1,
-            "mode": "enforce",
-            "never_reconcile_categories": ["PII", "SECRET", "FINANCIAL"],
-            "rules": [
-                {
-                    "id": "email_regex",
-                    "type": "regex",
-                    "pattern": r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b",
-                    "category": "PII",
-                    "action": "tokenize",
-                    "priority": 120,
-                },
-                {
-                    "id": "phone_regex",
-                    "type": "regex",
-                    "pattern": r"\b(?:\+?\d{1,3}[\s.-]?)?(?:\(?\d{2,4}\)?[\s.-]?)?\d{3,4}[\s.-]?\d{3,4}\b",
-                    "category": "PII",
-                    "action": "tokenize",
-                    "priority": 110,
-                },
-                {
-                    "id": "api_key_regex",
-                    "type": "regex",
-                    "pattern": r"\b(?:sk-[A-Za-z0-9]{20,}|AIza[0-9A-Za-z_\-]{20,})\b",
-                    "category": "SECRET",
-                    "action": "tokenize",
-                    "priority": 130,
-                },
-            ],
-            "lists": [
-                {
-                    "id": "clients",
-                    "source": "lists/clients.txt",
-                    "category": "BUSINESS",
-                    "action": "tokenize",
-                    "priority": 95,
-                }
-            ],
-        }
-        try:
-            import yaml  # type: ignore
-
-            settings.ruleset_file.write_text(yaml.safe_dump(default_rules, sort_keys=False), encoding="utf-8")
-        except Exception:
-            settings.ruleset_file.write_text(json.dumps(default_rules, indent=2), encoding="utf-8")
+        shutil.copyfile(_DEFAULTS_DIR / "ruleset.yaml", settings.ruleset_file)
 
     if not clients_path.exists():
-        clients_path.write_text("ACME S.p.A.\nUmbex SRL\nDemo Client\n", encoding="utf-8")
+        shutil.copyfile(_DEFAULTS_DIR / "clients.txt", clients_path)
 
 
 def create_app(base_dir: Path | None = None) -> FastAPI:
@@ -242,7 +317,12 @@ def create_app(base_dir: Path | None = None) -> FastAPI:
     rule_engine = RuleEngine(settings, db)
     llm_gateway = LLMGateway(settings)
 
-    app = FastAPI(title="GPT Cleaner Gateway", version=APP_VERSION)
+    @asynccontextmanager
+    async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+        await asyncio.to_thread(llm_gateway.resolve_client)
+        yield
+
+    app = FastAPI(title="GPT Cleaner Gateway", version=APP_VERSION, lifespan=lifespan)
     app.state.settings = settings
     app.state.db = db
     app.state.rule_engine = rule_engine
@@ -269,19 +349,19 @@ def create_app(base_dir: Path | None = None) -> FastAPI:
     app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
     @app.get("/health")
-    def health() -> Dict[str, str]:
+    async def health() -> Dict[str, str]:
         return {"status": "ok", "version": APP_VERSION}
 
     @app.get("/")
-    def root() -> FileResponse:
+    async def root() -> FileResponse:
         return FileResponse(static_dir / "index.html")
 
     @app.get("/api/models", response_model=ModelsResponse)
-    def list_models() -> ModelsResponse:
+    async def list_models() -> ModelsResponse:
         return ModelsResponse(default=settings.default_model, models=settings.available_models)
 
     @app.get("/api/config")
-    def get_config() -> Dict[str, Any]:
+    async def get_config() -> Dict[str, Any]:
         return {
             "app_version": APP_VERSION,
             "logging_enabled": settings.logging_enabled,
@@ -292,14 +372,14 @@ def create_app(base_dir: Path | None = None) -> FastAPI:
         }
 
     @app.put("/api/config")
-    def update_config(payload: Dict[str, Any]) -> Dict[str, Any]:
+    async def update_config(payload: Dict[str, Any]) -> Dict[str, Any]:
         if "logging_enabled" in payload:
             settings.logging_enabled = bool(payload["logging_enabled"])
         return {"ok": True, "logging_enabled": settings.logging_enabled}
 
     @app.post("/api/chat/sessions", response_model=SessionResponse)
     def create_session(request: SessionCreateRequest) -> SessionResponse:
-        session_id = str(uuid.uuid4())
+        session_id = new_id()
         created_at = now_utc()
         db.execute(
             "INSERT INTO chat_sessions (id, title, created_at) VALUES (?, ?, ?)",
@@ -309,8 +389,8 @@ def create_app(base_dir: Path | None = None) -> FastAPI:
 
     @app.get("/api/chat/sessions", response_model=List[SessionResponse])
     def get_sessions() -> List[SessionResponse]:
-        rows = db.fetchall("SELECT id, title, created_at FROM chat_sessions ORDER BY created_at DESC")
-        return [SessionResponse(**row) for row in rows]
+        rows = db.fetchall_rows("SELECT id, title, created_at FROM chat_sessions ORDER BY created_at DESC")
+        return [SessionResponse(id=row["id"], title=row["title"], created_at=row["created_at"]) for row in rows]
 
     @app.delete("/api/chat/sessions/{session_id}")
     def delete_session(session_id: str) -> Dict[str, Any]:
@@ -318,10 +398,12 @@ def create_app(base_dir: Path | None = None) -> FastAPI:
         if session is None:
             raise HTTPException(status_code=404, detail="Session not found")
 
-        db.execute("DELETE FROM audit_events WHERE session_id = ?", (session_id,))
-        db.execute("DELETE FROM token_mappings WHERE session_id = ?", (session_id,))
-        db.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
-        db.execute("DELETE FROM chat_sessions WHERE id = ?", (session_id,))
+        with db.transaction():
+            db.execute("DELETE FROM audit_events WHERE session_id = ?", (session_id,))
+            db.execute("DELETE FROM token_mappings WHERE session_id = ?", (session_id,))
+            db.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+            db.execute("DELETE FROM chat_sessions WHERE id = ?", (session_id,))
+        rule_engine.forget_session(session_id)
         return {"ok": True, "session_id": session_id}
 
     @app.get("/api/chat/sessions/{session_id}/messages", response_model=List[MessageResponse])
@@ -329,7 +411,7 @@ def create_app(base_dir: Path | None = None) -> FastAPI:
         session = db.fetchone("SELECT id FROM chat_sessions WHERE id = ?", (session_id,))
         if session is None:
             raise HTTPException(status_code=404, detail="Session not found")
-        rows = db.fetchall(
+        rows = db.fetchall_rows(
             "SELECT * FROM chat_messages WHERE session_id = ? ORDER BY created_at ASC",
             (session_id,),
         )
@@ -340,30 +422,22 @@ def create_app(base_dir: Path | None = None) -> FastAPI:
         filename = file.filename or "file.txt"
         ensure_allowed_filename(filename)
 
-        raw = await file.read()
-        if not raw:
-            raise HTTPException(status_code=400, detail="Empty file")
-
-        size_mb = len(raw) / (1024 * 1024)
-        if size_mb > settings.max_upload_mb:
-            raise HTTPException(status_code=400, detail=f"File exceeds {settings.max_upload_mb}MB limit")
-
-        file_id = str(uuid.uuid4())
+        file_id = new_id()
         destination = settings.uploads_dir / f"{file_id}{Path(filename).suffix.lower()}"
-        destination.write_bytes(raw)
+        size = await _stream_upload(file, destination, settings.max_upload_mb)
+        if size == 0:
+            destination.unlink(missing_ok=True)
+            raise HTTPException(status_code=400, detail="Empty file")
 
         try:
-            extracted = parse_file(destination)
+            extracted = await asyncio.to_thread(parse_file, destination)
         except FileParseError as exc:
             destination.unlink(missing_ok=True)
             raise HTTPException(status_code=400, detail=str(exc)) from exc
 
         created_at = now_utc()
-        db.execute(
-            """
-            INSERT INTO uploaded_files (id, filename, content_type, path, extracted_text, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
+        await db.execute_async(
+            _INSERT_UPLOADED_FILE_SQL,
             (
                 file_id,
                 filename,
@@ -397,24 +471,30 @@ def create_app(base_dir: Path | None = None) -> FastAPI:
 
     @app.post("/api/chat/sessions/{session_id}/messages", response_model=ChatTurnResponse)
     def post_message(session_id: str, request: MessageCreateRequest) -> ChatTurnResponse:
-        session = db.fetchone("SELECT id, title FROM chat_sessions WHERE id = ?", (session_id,))
+        session = db.fetchone(_SELECT_SESSION_FOR_TURN_SQL, (session_id,))
         if session is None:
             raise HTTPException(status_code=404, detail="Session not found")
 
         model = request.model or settings.default_model
-        if model not in settings.available_models:
+        if model not in settings.allowed_models:
             raise HTTPException(status_code=400, detail=f"Model not allowed: {model}")
 
-        effective_response_mode = request.response_mode
-        if effective_response_mode == "same_as_input" and not request.file_ids:
-            effective_response_mode = "chat"
-        if effective_response_mode in _FORCED_OUTPUT_EXTENSIONS and not request.file_ids:
-            effective_response_mode = "chat"
+        attachments_by_id: Dict[str, sqlite3.Row] = {}
+        if request.file_ids:
+            unique_file_ids = tuple(dict.fromkeys(request.file_ids))
+            placeholders = ",".join("?" * len(unique_file_ids))
+            attachments_by_id = {
+                row["id"]: row
+                for row in db.fetchall_rows(
+                    f"SELECT id, filename, extracted_text FROM uploaded_files WHERE id IN ({placeholders})",
+                    unique_file_ids,
+                )
+            }
 
         attachment_chunks: list[str] = []
         first_attachment_filename = ""
         for file_id in request.file_ids:
-            file_row = db.fetchone("SELECT filename, extracted_text FROM uploaded_files WHERE id = ?", (file_id,))
+            file_row = attachments_by_id.get(file_id)
             if file_row is None:
                 raise HTTPException(status_code=404, detail=f"Attachment not found: {file_id}")
             if not first_attachment_filename:
@@ -423,28 +503,31 @@ def create_app(base_dir: Path | None = None) -> FastAPI:
                 f"\n\n[ALLEGATO: {file_row['filename']}]\n{file_row['extracted_text']}"
             )
 
-        output_extension, mode_warning = _resolve_output_extension(
-            effective_response_mode,
+        effective_response_mode, output_extension, mode_warning = _resolve_output_extension(
+            request.response_mode,
             first_attachment_filename,
+            bool(request.file_ids),
         )
 
         original_user_text = request.message + "".join(attachment_chunks)
         sanitized = rule_engine.sanitize(session_id, original_user_text)
 
-        user_count_row = db.fetchone(
-            "SELECT COUNT(*) AS total FROM chat_messages WHERE session_id = ? AND role = 'user'",
-            (session_id,),
-        )
-        is_first_user_turn = int((user_count_row or {}).get("total", 0)) == 0
-        if is_first_user_turn and _is_default_session_title(session["title"]):
+        generated_title = ""
+        if not session["has_user_turn"] and _is_default_session_title(session["title"]):
             generated_title = _build_session_title_from_prompt(request.message)
-            if generated_title:
-                db.execute(
-                    "UPDATE chat_sessions SET title = ? WHERE id = ?",
-                    (generated_title, session_id),
-                )
 
-        user_message_id = str(uuid.uuid4())
+        provider_messages: list[Dict[str, str]] = []
+        if session["has_user_turn"]:
+            history_rows = db.fetchall_rows(
+                "SELECT role, sanitized_content FROM chat_messages WHERE session_id = ? ORDER BY created_at ASC",
+                (session_id,),
+            )
+            provider_messages = [
+                {"role": row["role"], "content": row["sanitized_content"]}
+                for row in history_rows
+            ]
+
+        user_message_id = new_id()
         user_created_at = now_utc()
         user_metadata = {
             "sanitized": True,
@@ -454,31 +537,27 @@ def create_app(base_dir: Path | None = None) -> FastAPI:
             "encoded_values": sanitized.encoded_values,
             "encoded_count": len(sanitized.encoded_values),
         }
-        db.execute(
-            """
-            INSERT INTO chat_messages (id, session_id, role, content, sanitized_content, model, created_at, metadata_json)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                user_message_id,
-                session_id,
-                "user",
-                original_user_text,
-                sanitized.sanitized_text,
-                model,
-                user_created_at,
-                Database.to_json(user_metadata),
-            ),
-        )
+        with db.transaction():
+            if generated_title:
+                db.execute(
+                    "UPDATE chat_sessions SET title = ? WHERE id = ?",
+                    (generated_title, session_id),
+                )
+            db.execute(
+                _INSERT_MESSAGE_SQL,
+                (
+                    user_message_id,
+                    session_id,
+                    "user",
+                    original_user_text,
+                    sanitized.sanitized_text,
+                    model,
+                    user_created_at,
+                    Database.to_json(user_metadata),
+                ),
+            )
 
-        history_rows = db.fetchall(
-            "SELECT role, sanitized_content FROM chat_messages WHERE session_id = ? ORDER BY created_at ASC",
-            (session_id,),
-        )
-        provider_messages = [
-            {"role": row["role"], "content": row["sanitized_content"]}
-            for row in history_rows
-        ]
+        provider_messages.append({"role": "user", "content": sanitized.sanitized_text})
         if _TOKEN_PLACEHOLDER_PATTERN.search(sanitized.sanitized_text):
             provider_messages.append(
                 {
@@ -504,49 +583,20 @@ def create_app(base_dir: Path | None = None) -> FastAPI:
 
         generated_file_payload: GeneratedFileResponse | None = None
         generated_file_warning: str | None = None
+        generated_file_row: tuple[Any, ...] | None = None
         if output_extension and request.file_ids:
-            source_row = db.fetchone(
-                "SELECT id, filename FROM uploaded_files WHERE id = ?",
-                (request.file_ids[0],),
-            )
+            source_row = attachments_by_id.get(request.file_ids[0])
             if source_row is not None:
-                generated_file_id = str(uuid.uuid4())
-                generated = generate_response_file(
-                    output_dir=settings.uploads_dir,
-                    source_filename=source_row["filename"],
-                    content=assistant_content,
-                    file_id=generated_file_id,
-                    output_extension=output_extension,
-                )
-                warnings = [warning for warning in [mode_warning, generated.warning] if warning]
-                generated_file_warning = "; ".join(warnings) if warnings else None
-                created_at = now_utc()
-                db.execute(
-                    """
-                    INSERT INTO uploaded_files (id, filename, content_type, path, extracted_text, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        generated_file_id,
-                        generated.filename,
-                        generated.content_type,
-                        str(generated.path),
-                        assistant_content,
-                        created_at,
-                    ),
-                )
-                size = generated.path.stat().st_size if generated.path.exists() else 0
-                generated_file_payload = GeneratedFileResponse(
-                    id=generated_file_id,
-                    filename=generated.filename,
-                    content_type=generated.content_type,
-                    size=size,
-                    download_url=f"/api/files/{generated_file_id}/download",
-                    source_file_id=source_row["id"],
-                    mode=effective_response_mode,
+                generated_file_payload, generated_file_warning, generated_file_row = _materialize_generated_file(
+                    settings.uploads_dir,
+                    source_row,
+                    assistant_content,
+                    output_extension,
+                    effective_response_mode,
+                    mode_warning,
                 )
 
-        assistant_message_id = str(uuid.uuid4())
+        assistant_message_id = new_id()
         assistant_created_at = now_utc()
         assistant_metadata = {
             "reconciled": True,
@@ -560,26 +610,21 @@ def create_app(base_dir: Path | None = None) -> FastAPI:
             "generated_file_id": generated_file_payload.id if generated_file_payload else None,
             "generated_file_warning": generated_file_warning,
         }
-        db.execute(
-            """
-            INSERT INTO chat_messages (id, session_id, role, content, sanitized_content, model, created_at, metadata_json)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                assistant_message_id,
-                session_id,
-                "assistant",
-                assistant_content,
-                llm_raw_response,
-                model,
-                assistant_created_at,
-                Database.to_json(assistant_metadata),
-            ),
+        assistant_row = (
+            assistant_message_id,
+            session_id,
+            "assistant",
+            assistant_content,
+            llm_raw_response,
+            model,
+            assistant_created_at,
+            Database.to_json(assistant_metadata),
         )
 
         audit_id = None
+        audit_row: tuple[Any, ...] | None = None
         if settings.logging_enabled:
-            audit_id = str(uuid.uuid4())
+            audit_id = new_id()
             details = {
                 "model": model,
                 "llm_usage": usage,
@@ -588,29 +633,27 @@ def create_app(base_dir: Path | None = None) -> FastAPI:
                 "response_mode": effective_response_mode,
                 "output_extension": output_extension,
             }
-            db.execute(
-                """
-                INSERT INTO audit_events (
-                    id, created_at, session_id, message_id, correlation_id,
-                    rules_triggered_json, transformations, tokens_created, tokens_reconciled,
-                    original_hash, details_json
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    audit_id,
-                    now_utc(),
-                    session_id,
-                    user_message_id,
-                    str(uuid.uuid4()),
-                    Database.to_json(sanitized.rules_triggered),
-                    sanitized.transformations,
-                    sanitized.tokens_created,
-                    tokens_reconciled,
-                    sanitized.original_hash,
-                    Database.to_json(details),
-                ),
+            audit_row = (
+                audit_id,
+                now_utc(),
+                session_id,
+                user_message_id,
+                new_id(),
+                Database.to_json(sanitized.rules_triggered),
+                sanitized.transformations,
+                sanitized.tokens_created,
+                tokens_reconciled,
+                sanitized.original_hash,
+                Database.to_json(details),
             )
 
+        with db.transaction():
+            if generated_file_row is not None:
+                db.execute(_INSERT_UPLOADED_FILE_SQL, generated_file_row)
+            db.execute(_INSERT_MESSAGE_SQL, assistant_row)
+            if audit_row is not None:
+                db.execute(_INSERT_AUDIT_EVENT_SQL, audit_row)
+
         user_response = MessageResponse(
             id=user_message_id,
             role="user",
@@ -653,7 +696,7 @@ def create_app(base_dir: Path | None = None) -> FastAPI:
         if not settings.logging_enabled:
             raise HTTPException(status_code=404, detail="Logging is disabled")
 
-        row = db.fetchone("SELECT * FROM audit_events WHERE id = ?", (event_id,))
+        row = db.fetchone(_SELECT_AUDIT_EVENT_SQL, (event_id,))
         if row is None:
             raise HTTPException(status_code=404, detail="Audit event not found")
 
@@ -687,16 +730,19 @@ def create_app(base_dir: Path | None = None) -> FastAPI:
         if not target_dir.exists():
             return []
 
+        with os.scandir(target_dir) as it:
+            entries = sorted(
+                (entry for entry in it if entry.is_file() and not entry.name.endswith(_PARTIAL_SUFFIX)),
+                key=lambda entry: entry.name,
+            )
+
         items: list[RulesFileListItem] = []
-        for file_path in sorted(target_dir.iterdir()):
-            if not file_path.is_file():
-                continue
-            relative = str(file_path.relative_to(settings.rules_dir))
-            stat = file_path.stat()
+        for entry in entries:
+            stat = entry.stat()
             items.append(
                 RulesFileListItem(
-                    file_id=relative,
-                    name=file_path.name,
+                    file_id=os.path.relpath(entry.path, settings.rules_dir),
+                    name=entry.name,
                     size=stat.st_size,
                     updated_at=stat.st_mtime,
                 )
@@ -714,16 +760,20 @@ def create_app(base_dir: Path | None = None) -> FastAPI:
             raise HTTPException(status_code=400, detail="Extension not allowed for rules file")
 
         target_dir = _resolve_file_id(settings.rules_dir, subdir)
-        target_dir.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(target_dir.mkdir, parents=True, exist_ok=True)
         destination = _resolve_file_id(settings.rules_dir, str(Path(subdir) / Path(filename).name))
 
-        if destination.exists() and not overwrite:
+        if not overwrite and await asyncio.to_thread(destination.exists):
             raise HTTPException(status_code=409, detail="File already exists. Use overwrite=true")
 
-        content = await file.read()
-        destination.write_bytes(content)
+        partial = destination.with_name(f"{destination.name}{_PARTIAL_SUFFIX}")
+        try:
+            await _stream_upload(file, partial)
+            await asyncio.to_thread(partial.replace, destination)
+        finally:
+            await asyncio.to_thread(partial.unlink, missing_ok=True)
 
-        stat = destination.stat()
+        stat = await asyncio.to_thread(destination.stat)
         return RulesFileListItem(
             file_id=str(destination.relative_to(settings.rules_dir)),
             name=destination.name,
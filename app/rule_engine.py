@@ -2,18 +2,139 @@ from __future__ import annotations
 
 import csv
 import json
+import os
 import re
-import uuid
-from dataclasses import dataclass, field
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from threading import Lock
-from typing import Dict, List, Sequence, Tuple
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
 from .config import Settings
-from .db import Database
+from .db import Database, new_id
 from .security import decrypt_value, deterministic_anagram, encrypt_value, hash_text, simple_encrypt
 
+try:
+    import ahocorasick  # type: ignore
+except ImportError:  # pragma: no cover
+    ahocorasick = None
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import re2  # type: ignore
+except ImportError:  # pragma: no cover
+    re2 = None
+
+
+_SELECT_TOKENS_BY_VALUE_SQL = (
+    "SELECT value_hash, category, token FROM token_mappings "
+    "WHERE session_id = ? AND value_hash IN ({placeholders})"
+)
+_COUNT_CATEGORY_TOKENS_SQL = (
+    "SELECT category, COUNT(*) AS count FROM token_mappings WHERE session_id = ? AND category IN ({placeholders}) "
+    "GROUP BY category"
+)
+_SELECT_TOKEN_MAPPINGS_SQL = (
+    "SELECT token, original_value_enc, expires_at FROM token_mappings "
+    "WHERE session_id = ? AND token IN ({placeholders})"
+)
+_TOKEN_LOOKUP_BATCH_SIZE = 500
+_DELETE_ALL_TOKEN_MAPPINGS_SQL = "DELETE FROM token_mappings"
+_INSERT_TOKEN_MAPPING_SQL = """
+INSERT INTO token_mappings (
+    id, session_id, token, value_hash, original_value_enc, category, created_at, expires_at
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+# Extra case-insensitive equivalences that re applies on top of str.lower() (CPython's re._casefix table).
+_RE_EXTRA_CASES: Dict[int, Tuple[int, ...]] = {
+    0x0069: (0x0131,), 0x0073: (0x017F,), 0x00B5: (0x03BC,), 0x0131: (0x0069,), 0x017F: (0x0073,),
+    0x0345: (0x03B9, 0x1FBE), 0x0390: (0x1FD3,), 0x03B0: (0x1FE3,), 0x03B2: (0x03D0,), 0x03B5: (0x03F5,),
+    0x03B8: (0x03D1,), 0x03B9: (0x0345, 0x1FBE), 0x03BA: (0x03F0,), 0x03BC: (0x00B5,), 0x03C0: (0x03D6,),
+    0x03C1: (0x03F1,), 0x03C2: (0x03C3,), 0x03C3: (0x03C2,), 0x03C6: (0x03D5,), 0x03D0: (0x03B2,),
+    0x03D1: (0x03B8,), 0x03D5: (0x03C6,), 0x03D6: (0x03C0,), 0x03F0: (0x03BA,), 0x03F1: (0x03C1,),
+    0x03F5: (0x03B5,), 0x0432: (0x1C80,), 0x0434: (0x1C81,), 0x043E: (0x1C82,), 0x0441: (0x1C83,),
+    0x0442: (0x1C84, 0x1C85), 0x044A: (0x1C86,), 0x0463: (0x1C87,), 0x1C80: (0x0432,), 0x1C81: (0x0434,),
+    0x1C82: (0x043E,), 0x1C83: (0x0441,), 0x1C84: (0x0442, 0x1C85), 0x1C85: (0x0442, 0x1C84),
+    0x1C86: (0x044A,), 0x1C87: (0x0463,), 0x1C88: (0xA64B,), 0x1E61: (0x1E9B,), 0x1E9B: (0x1E61,),
+    0x1FBE: (0x0345, 0x03B9), 0x1FD3: (0x0390,), 0x1FE3: (0x03B0,), 0xA64B: (0x1C88,), 0xFB05: (0xFB06,),
+    0xFB06: (0xFB05,),
+}
+
+
+def _special_fold_chars() -> frozenset[str]:
+    chars = {"\u0130"}
+    for lowered, extra in _RE_EXTRA_CASES.items():
+        for code in (lowered, *extra):
+            char = chr(code)
+            chars.update(char, char.upper())
+    return frozenset(char for char in chars if not char.isascii())
+
+
+_SPECIAL_FOLD_CHARS = _special_fold_chars()
+
+
+def _has_exact_lowercase(text: str) -> bool:
+    if text.isascii():
+        return True
+    return _SPECIAL_FOLD_CHARS.isdisjoint(text)
+
+
+_RE2_UNSAFE_PATTERN_MARKERS = ("$", "[:", "{,")
+_RE2_UNSAFE_TEXT_CHARS = frozenset("\x0b\x1c\x1d\x1e\x1f")
+
+
+def _compile_re2(pattern: str, case_sensitive: bool) -> Any:
+    if re2 is None or not pattern.isascii():
+        return None
+    if any(marker in pattern for marker in _RE2_UNSAFE_PATTERN_MARKERS):
+        return None
+    options = re2.Options()
+    options.case_sensitive = case_sensitive
+    options.log_errors = False
+    try:
+        return re2.compile(pattern, options)
+    except re2.error:
+        return None
+
+
+def _is_re2_safe_text(text: str) -> bool:
+    return text.isascii() and _RE2_UNSAFE_TEXT_CHARS.isdisjoint(text)
+
+
+_SANITIZE_CACHE_SIZE = 256
+_SANITIZE_CACHE_MAX_CHARS = 200_000
+_SANITIZE_CACHE_MAX_TOTAL_CHARS = 4_000_000
+
+_TOKEN_RE = re.compile(r"<TKN_(?P<category>[A-Z0-9_]+)_(?P<index>[0-9]{3})>")
+_GROUP_REFERENCE_RE = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+def _compile_term_pattern(term: str, case_sensitive: bool, word_boundary: bool) -> re.Pattern[str]:
+    pattern = re.escape(term)
+    if word_boundary:
+        start_boundary = r"\b" if _is_word_char(term[0]) else ""
+        end_boundary = r"\b" if _is_word_char(term[-1]) else ""
+        pattern = f"{start_boundary}{pattern}{end_boundary}"
+    return re.compile(pattern, 0 if case_sensitive else re.IGNORECASE)
+
+
+@dataclass(slots=True)
+class _TermAutomaton:
+    automaton: Any
+    terms: List[Tuple[int, bool, bool]]
+    regex_term_patterns: List[re.Pattern[str]]
+
 
 @dataclass(slots=True)
 class RuleDefinition:
@@ -27,6 +148,13 @@ class RuleDefinition:
     pattern: str = ""
     replacement: str = ""
     terms: List[str] = field(default_factory=list)
+    compiled_pattern: Optional[re.Pattern[str]] = None
+    re2_pattern: Any = None
+    term_patterns: Optional[List[re.Pattern[str]]] = None
+    term_automaton: Optional[_TermAutomaton] = None
+
+    def __post_init__(self) -> None:
+        self.action = str(self.action).lower().strip()
 
 
 @dataclass(slots=True)
@@ -35,6 +163,9 @@ class RulesetState:
     mode: str
     never_reconcile_categories: set[str]
     rules: List[RuleDefinition]
+    regex_gates: List[re.Pattern[str]] = field(default_factory=list)
+    rule_gates: List[Optional[int]] = field(default_factory=list)
+    generation: int = 0
 
 
 @dataclass(slots=True)
@@ -48,6 +179,10 @@ class SanitizationResult:
     original_hash: str
 
 
+def _cached_chars(result: SanitizationResult) -> int:
+    return len(result.original_text) + len(result.sanitized_text)
+
+
 @dataclass(slots=True)
 class _Candidate:
     start: int
@@ -62,6 +197,14 @@ class RuleEngine:
         self._db = db
         self._lock = Lock()
         self._state = RulesetState(version=1, mode="enforce", never_reconcile_categories=set(), rules=[])
+        self._sanitize_cache: OrderedDict[Tuple[str, int, str], SanitizationResult] = OrderedDict()
+        self._sanitize_cache_chars = 0
+        self._sanitize_cache_lock = Lock()
+        self._action_handlers: Dict[str, Callable[[RuleDefinition, str], str]] = {
+            "replace": lambda rule, value: rule.replacement or f"[{rule.category}]",
+            "anagram": lambda rule, value: deterministic_anagram(value, settings.token_secret),
+            "simple_encrypt": lambda rule, value: simple_encrypt(value, settings.token_secret),
+        }
         self.reload()
 
     @property
@@ -69,10 +212,9 @@ class RuleEngine:
         return set(self._state.never_reconcile_categories)
 
     def get_rule_counts(self) -> Tuple[int, int]:
-        with self._lock:
-            all_rules = self._state.rules
-            list_rules = [rule for rule in all_rules if rule.rule_type == "list"]
-            return len(all_rules), len(list_rules)
+        all_rules = self._state.rules
+        list_rules = [rule for rule in all_rules if rule.rule_type == "list"]
+        return len(all_rules), len(list_rules)
 
     def validate(self) -> Tuple[bool, int, int, str]:
         try:
@@ -85,7 +227,47 @@ class RuleEngine:
     def reload(self) -> None:
         state = self._load_ruleset()
         with self._lock:
+            state.generation = self._state.generation + 1
             self._state = state
+        self._clear_sanitize_cache()
+
+    def forget_session(self, session_id: str) -> None:
+        with self._sanitize_cache_lock:
+            for key in [key for key in self._sanitize_cache if key[0] == session_id]:
+                self._sanitize_cache_chars -= _cached_chars(self._sanitize_cache.pop(key))
+
+    # Wipes token mappings for every session; only the test suite calls this between tests.
+    def clear_all_tokens(self) -> None:
+        self._db.execute(_DELETE_ALL_TOKEN_MAPPINGS_SQL)
+        self._clear_sanitize_cache()
+
+    def _clear_sanitize_cache(self) -> None:
+        with self._sanitize_cache_lock:
+            self._sanitize_cache.clear()
+            self._sanitize_cache_chars = 0
+
+    def _cached_sanitization(self, key: Tuple[str, int, str]) -> SanitizationResult | None:
+        with self._sanitize_cache_lock:
+            result = self._sanitize_cache.get(key)
+            if result is not None:
+                self._sanitize_cache.move_to_end(key)
+            return result
+
+    def _remember_sanitization(self, key: Tuple[str, int, str], result: SanitizationResult) -> None:
+        if len(result.original_text) > _SANITIZE_CACHE_MAX_CHARS:
+            return
+        with self._sanitize_cache_lock:
+            previous = self._sanitize_cache.pop(key, None)
+            if previous is not None:
+                self._sanitize_cache_chars -= _cached_chars(previous)
+            self._sanitize_cache[key] = result
+            self._sanitize_cache_chars += _cached_chars(result)
+            while (
+                len(self._sanitize_cache) > _SANITIZE_CACHE_SIZE
+                or self._sanitize_cache_chars > _SANITIZE_CACHE_MAX_TOTAL_CHARS
+            ):
+                _, evicted = self._sanitize_cache.popitem(last=False)
+                self._sanitize_cache_chars -= _cached_chars(evicted)
 
     def _load_ruleset(self) -> RulesetState:
         ruleset_data = self._read_ruleset_file(self._settings.ruleset_file)
@@ -112,9 +294,10 @@ class RuleEngine:
                 continue
             declared_list_sources.add(source)
             list_path = (self._settings.rules_dir / source).resolve()
-            terms = self._load_terms(list_path)
+            loaded_terms = self._load_terms(list_path)
             if bool(item.get("include_reversed_word_order", False)):
-                terms = self._expand_reversed_word_order(terms)
+                self._expand_reversed_word_order(loaded_terms)
+            terms = list(loaded_terms.values())
             rules.append(
                 RuleDefinition(
                     id=item.get("id", f"list_{list_path.stem}"),
@@ -130,15 +313,15 @@ class RuleEngine:
 
         lists_dir = self._settings.rules_dir / "lists"
         if lists_dir.exists():
-            for file_path in sorted(lists_dir.iterdir()):
-                if not file_path.is_file():
+            with os.scandir(lists_dir) as entries:
+                list_entries = sorted((entry for entry in entries if entry.is_file()), key=lambda entry: entry.name)
+            for entry in list_entries:
+                if os.path.join("lists", entry.name) in declared_list_sources:
                     continue
-                relative = str(file_path.relative_to(self._settings.rules_dir))
-                if relative in declared_list_sources:
+                if os.path.splitext(entry.name)[1].lower() not in {".txt", ".csv", ".json"}:
                     continue
-                if file_path.suffix.lower() not in {".txt", ".csv", ".json"}:
-                    continue
-                terms = self._load_terms(file_path)
+                file_path = Path(entry.path)
+                terms = list(self._load_terms(file_path).values())
                 if not terms:
                     continue
                 rules.append(
@@ -162,7 +345,78 @@ class RuleEngine:
         if not never:
             never = set(self._settings.never_reconcile_categories)
 
-        return RulesetState(version=version, mode=mode, never_reconcile_categories=never, rules=rules)
+        for rule in rules:
+            if rule.rule_type == "list":
+                rule.term_automaton = self._build_term_automaton(rule)
+            elif rule.rule_type == "regex" and rule.pattern:
+                try:
+                    rule.compiled_pattern = re.compile(rule.pattern, 0 if rule.case_sensitive else re.IGNORECASE)
+                except re.error:
+                    continue
+                rule.re2_pattern = _compile_re2(rule.pattern, rule.case_sensitive)
+        regex_gates, rule_gates = self._build_regex_gates(rules)
+        return RulesetState(
+            version=version,
+            mode=mode,
+            never_reconcile_categories=never,
+            rules=rules,
+            regex_gates=regex_gates,
+            rule_gates=rule_gates,
+        )
+
+    @staticmethod
+    def _build_term_automaton(rule: RuleDefinition) -> Optional[_TermAutomaton]:
+        if ahocorasick is None or not rule.terms:
+            return None
+        automaton = ahocorasick.Automaton()
+        terms: list[Tuple[int, bool, bool]] = []
+        regex_term_patterns: list[re.Pattern[str]] = []
+        for term in rule.terms:
+            if not term:
+                continue
+            if not rule.case_sensitive and not _has_exact_lowercase(term):
+                regex_term_patterns.append(_compile_term_pattern(term, rule.case_sensitive, rule.word_boundary))
+                continue
+            key = term if rule.case_sensitive else term.lower()
+            if automaton.exists(key):
+                continue
+            automaton.add_word(key, len(terms))
+            terms.append(
+                (
+                    len(term),
+                    rule.word_boundary and _is_word_char(term[0]),
+                    rule.word_boundary and _is_word_char(term[-1]),
+                )
+            )
+        if not terms:
+            return None
+        automaton.make_automaton()
+        return _TermAutomaton(automaton=automaton, terms=terms, regex_term_patterns=regex_term_patterns)
+
+    @staticmethod
+    def _build_regex_gates(rules: Sequence[RuleDefinition]) -> Tuple[List[re.Pattern[str]], List[Optional[int]]]:
+        members_by_flags: Dict[bool, List[int]] = {}
+        for index, rule in enumerate(rules):
+            if rule.rule_type != "regex" or rule.compiled_pattern is None:
+                continue
+            if rule.compiled_pattern.groupindex or _GROUP_REFERENCE_RE.search(rule.pattern):
+                continue
+            members_by_flags.setdefault(rule.case_sensitive, []).append(index)
+
+        regex_gates: list[re.Pattern[str]] = []
+        rule_gates: list[Optional[int]] = [None] * len(rules)
+        for case_sensitive, members in members_by_flags.items():
+            if len(members) < 2:
+                continue
+            alternation = "|".join(f"(?:{rules[index].pattern})" for index in members)
+            try:
+                gate = re.compile(alternation, 0 if case_sensitive else re.IGNORECASE)
+            except re.error:
+                continue
+            for index in members:
+                rule_gates[index] = len(regex_gates)
+            regex_gates.append(gate)
+        return regex_gates, rule_gates
 
     def _read_ruleset_file(self, ruleset_file: Path) -> Dict:
         if not ruleset_file.exists():
@@ -175,9 +429,9 @@ class RuleEngine:
                 import yaml  # type: ignore
             except ImportError as exc:  # pragma: no cover
                 raise RuntimeError("PyYAML is not installed") from exc
-            data = yaml.safe_load(content) or {}
+            data = yaml.load(content, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)) or {}
         elif suffix == ".json":
-            data = json.loads(content)
+            data = orjson.loads(content) if orjson is not None else json.loads(content)
         else:
             raise ValueError(f"Unsupported ruleset format: {suffix}")
 
@@ -185,17 +439,18 @@ class RuleEngine:
             raise ValueError("Ruleset must be an object")
         return data
 
-    def _load_terms(self, file_path: Path) -> List[str]:
+    def _load_terms(self, file_path: Path) -> Dict[str, str]:
         if not file_path.exists():
             raise FileNotFoundError(f"List file not found: {file_path}")
 
         suffix = file_path.suffix.lower()
-        terms: list[str] = []
+        terms: Dict[str, str] = {}
+        add_term = terms.setdefault
         if suffix == ".txt":
             for line in file_path.read_text(encoding="utf-8", errors="ignore").splitlines():
                 value = line.strip()
                 if value and not value.startswith("#"):
-                    terms.append(value)
+                    add_term(value.casefold(), value)
         elif suffix == ".csv":
             with file_path.open("r", encoding="utf-8", errors="ignore", newline="") as handle:
                 reader = csv.reader(handle)
@@ -203,43 +458,30 @@ class RuleEngine:
                     for item in row:
                         value = item.strip()
                         if value:
-                            terms.append(value)
+                            add_term(value.casefold(), value)
         elif suffix == ".json":
             payload = json.loads(file_path.read_text(encoding="utf-8"))
+            items: list[Any] = []
             if isinstance(payload, list):
-                terms.extend(str(item).strip() for item in payload if str(item).strip())
+                items = payload
             elif isinstance(payload, dict) and isinstance(payload.get("terms"), list):
-                terms.extend(str(item).strip() for item in payload["terms"] if str(item).strip())
+                items = payload["terms"]
+            for item in items:
+                value = str(item).strip()
+                if value:
+                    add_term(value.casefold(), value)
         else:
             raise ValueError(f"Unsupported list format: {suffix}")
+        return terms
 
-        deduplicated: list[str] = []
-        seen: set[str] = set()
-        for term in terms:
-            normalized = term.strip()
-            key = normalized.casefold()
-            if not normalized or key in seen:
-                continue
-            seen.add(key)
-            deduplicated.append(normalized)
-        return deduplicated
-
-    def _expand_reversed_word_order(self, terms: List[str]) -> List[str]:
-        expanded: list[str] = list(terms)
-        seen = {item.casefold() for item in expanded}
-
-        for term in terms:
-            parts = [piece for piece in term.split() if piece]
+    def _expand_reversed_word_order(self, terms: Dict[str, str]) -> None:
+        add_term = terms.setdefault
+        for term in list(terms.values()):
+            parts = term.split()
             if len(parts) < 2:
                 continue
             reversed_term = " ".join(reversed(parts))
-            key = reversed_term.casefold()
-            if key in seen:
-                continue
-            seen.add(key)
-            expanded.append(reversed_term)
-
-        return expanded
+            add_term(reversed_term.casefold(), reversed_term)
 
     def sanitize(self, session_id: str, text: str) -> SanitizationResult:
         original = text or ""
@@ -255,19 +497,44 @@ class RuleEngine:
                 original_hash=original_hash,
             )
 
-        with self._lock:
-            rules_snapshot = list(self._state.rules)
+        state = self._state
+        cache_key = (session_id, state.generation, original_hash)
+        cached = self._cached_sanitization(cache_key)
+        if cached is not None:
+            return replace(cached, tokens_created=0)
+
+        gate_starts: list[Optional[int]] = []
+        for gate in state.regex_gates:
+            first = gate.search(original)
+            gate_starts.append(first.start() if first is not None else None)
 
+        exact_lowercase = _has_exact_lowercase(original)
+        re2_safe = _is_re2_safe_text(original)
+        lowered: Optional[str] = None
         candidates: list[_Candidate] = []
-        for rule in rules_snapshot:
-            if rule.rule_type == "regex" and rule.pattern:
-                candidates.extend(self._find_regex_matches(original, rule))
+        for rule, gate_index in zip(state.rules, state.rule_gates):
+            if rule.rule_type == "regex" and rule.compiled_pattern is not None:
+                if gate_index is None:
+                    candidates.extend(self._find_regex_matches(original, rule, 0, re2_safe))
+                elif gate_starts[gate_index] is not None:
+                    candidates.extend(self._find_regex_matches(original, rule, gate_starts[gate_index], re2_safe))
             elif rule.rule_type == "list" and rule.terms:
-                candidates.extend(self._find_term_matches(original, rule))
+                matcher = rule.term_automaton
+                if matcher is None or not (rule.case_sensitive or exact_lowercase):
+                    candidates.extend(self._find_term_matches(original, rule, self._term_patterns(rule)))
+                    continue
+                if rule.case_sensitive:
+                    haystack = original
+                else:
+                    if lowered is None:
+                        lowered = original.lower()
+                    haystack = lowered
+                candidates.extend(self._find_automaton_matches(original, haystack, rule, matcher))
+                candidates.extend(self._find_term_matches(original, rule, matcher.regex_term_patterns))
 
         selected = self._resolve_overlaps(candidates)
         if not selected:
-            return SanitizationResult(
+            result = SanitizationResult(
                 original_text=original,
                 sanitized_text=original,
                 rules_triggered=[],
@@ -276,33 +543,41 @@ class RuleEngine:
                 encoded_values=[],
                 original_hash=original_hash,
             )
+            self._remember_sanitization(cache_key, result)
+            return result
+
+        token_keys = [
+            self._token_key(match.value, match.rule.category) if match.rule.action == "tokenize" else None
+            for match in selected
+        ]
+        pending: Dict[Tuple[str, str], str] = {}
+        for match, token_key in zip(selected, token_keys):
+            if token_key is not None:
+                pending.setdefault(token_key, match.value)
+        tokens, tokens_created = self._get_or_create_tokens(session_id, pending) if pending else ({}, 0)
 
-        selected.sort(key=lambda item: item.start)
-        cursor = 0
         chunks: list[str] = []
-        triggered: set[str] = set()
-        tokens_created = 0
+        append_chunk = chunks.append
+        apply_action = self._apply_action
         encoded_values: list[str] = []
         encoded_seen: set[str] = set()
-
-        for match in selected:
-            chunks.append(original[cursor : match.start])
-            replacement, created = self._apply_action(session_id, match.rule, match.value)
-            chunks.append(replacement)
-            cursor = match.end
-            triggered.add(match.rule.id)
-            if created:
-                tokens_created += 1
-            if match.rule.action.lower().strip() == "tokenize":
+        cursor = 0
+        for match, token_key in zip(selected, token_keys):
+            append_chunk(original[cursor : match.start])
+            if token_key is None:
+                append_chunk(apply_action(match.rule, match.value))
+            else:
+                append_chunk(tokens[token_key])
                 key = match.value.casefold()
                 if key not in encoded_seen:
                     encoded_seen.add(key)
                     encoded_values.append(match.value)
-
-        chunks.append(original[cursor:])
+            cursor = match.end
+        append_chunk(original[cursor:])
         sanitized = "".join(chunks)
+        triggered = {match.rule.id for match in selected}
 
-        return SanitizationResult(
+        result = SanitizationResult(
             original_text=original,
             sanitized_text=sanitized,
             rules_triggered=sorted(triggered),
@@ -311,57 +586,139 @@ class RuleEngine:
             encoded_values=encoded_values,
             original_hash=original_hash,
         )
+        self._remember_sanitization(cache_key, result)
+        return result
 
     def reconcile(self, session_id: str, text: str) -> Tuple[str, int, List[str], List[str]]:
         if not text:
             return text, 0, [], []
 
-        token_pattern = re.compile(r"<TKN_[A-Z0-9_]+_[0-9]{3}>")
-        tokens = sorted(set(token_pattern.findall(text)), key=len, reverse=True)
+        never_reconcile = self._state.never_reconcile_categories
+        tokens = list(
+            dict.fromkeys(
+                match.group(0)
+                for match in _TOKEN_RE.finditer(text)
+                if match.group("category").upper() not in never_reconcile
+            )
+        )
+        if not tokens:
+            return text, 0, [], []
+
+        rows: Dict[str, Dict[str, Any]] = {}
+        for offset in range(0, len(tokens), _TOKEN_LOOKUP_BATCH_SIZE):
+            batch = tokens[offset : offset + _TOKEN_LOOKUP_BATCH_SIZE]
+            query = _SELECT_TOKEN_MAPPINGS_SQL.format(placeholders=",".join("?" * len(batch)))
+            for row in self._db.fetchall(query, (session_id, *batch)):
+                rows[row["token"]] = row
 
-        reconciled = text
-        replaced_count = 0
+        now = datetime.now(timezone.utc).isoformat()
+        values: Dict[str, str] = {}
         missing: list[str] = []
         decoded_values: list[str] = []
         decoded_seen: set[str] = set()
-
         for token in tokens:
-            category_match = re.match(r"<TKN_([A-Z0-9_]+)_([0-9]{3})>", token)
-            category = category_match.group(1) if category_match else ""
-
-            if category.upper() in self._state.never_reconcile_categories:
-                continue
-
-            row = self._db.fetchone(
-                "SELECT original_value_enc, expires_at FROM token_mappings WHERE session_id = ? AND token = ?",
-                (session_id, token),
-            )
-            if row is None:
+            row = rows.get(token)
+            if row is None or row["expires_at"] < now:
                 missing.append(token)
                 continue
-
-            if row["expires_at"] < datetime.now(timezone.utc).isoformat():
-                missing.append(token)
-                continue
-
             original_value = decrypt_value(row["original_value_enc"], self._settings.token_secret)
-            occurrences = reconciled.count(token)
-            if occurrences == 0:
-                continue
-            reconciled = reconciled.replace(token, original_value)
-            replaced_count += occurrences
+            values[token] = original_value
             value_key = original_value.casefold()
             if value_key not in decoded_seen:
                 decoded_seen.add(value_key)
                 decoded_values.append(original_value)
 
+        replaced_count = 0
+
+        def substitute(match: re.Match[str]) -> str:
+            nonlocal replaced_count
+            token = match.group(0)
+            original_value = values.get(token)
+            if original_value is None:
+                return token
+            replaced_count += 1
+            return original_value
+
+        reconciled = _TOKEN_RE.sub(substitute, text) if values else text
         return reconciled, replaced_count, missing, decoded_values
 
-    def _find_regex_matches(self, text: str, rule: RuleDefinition) -> List[_Candidate]:
-        flags = 0 if rule.case_sensitive else re.IGNORECASE
+    def _find_regex_matches(
+        self,
+        text: str,
+        rule: RuleDefinition,
+        pos: int = 0,
+        re2_safe: bool = False,
+    ) -> List[_Candidate]:
+        if re2_safe and rule.re2_pattern is not None:
+            found_re2 = self._find_re2_matches(text, rule, pos)
+            if found_re2 is not None:
+                return found_re2
+
         found: list[_Candidate] = []
-        try:
-            for match in re.finditer(rule.pattern, text, flags):
+        for match in rule.compiled_pattern.finditer(text, pos):
+            found.append(
+                _Candidate(
+                    start=match.start(),
+                    end=match.end(),
+                    value=match.group(0),
+                    rule=rule,
+                )
+            )
+        return found
+
+    def _find_re2_matches(self, text: str, rule: RuleDefinition, pos: int) -> Optional[List[_Candidate]]:
+        found: list[_Candidate] = []
+        for match in rule.re2_pattern.finditer(text, pos):
+            start, end = match.start(), match.end()
+            if start == end:
+                return None
+            found.append(_Candidate(start=start, end=end, value=match.group(0), rule=rule))
+        return found
+
+    def _find_automaton_matches(
+        self,
+        text: str,
+        haystack: str,
+        rule: RuleDefinition,
+        matcher: _TermAutomaton,
+    ) -> List[_Candidate]:
+        found: list[_Candidate] = []
+        text_length = len(text)
+        terms = matcher.terms
+        last_end = [0] * len(terms)
+        for end_index, term_index in matcher.automaton.iter(haystack):
+            length, start_boundary, end_boundary = terms[term_index]
+            end = end_index + 1
+            start = end - length
+            if start < last_end[term_index]:
+                continue
+            if start_boundary and (start > 0 and _is_word_char(text[start - 1])) == _is_word_char(text[start]):
+                continue
+            if end_boundary and (end < text_length and _is_word_char(text[end])) == _is_word_char(text[end - 1]):
+                continue
+            last_end[term_index] = end
+            found.append(_Candidate(start=start, end=end, value=text[start:end], rule=rule))
+        return found
+
+    @staticmethod
+    def _term_patterns(rule: RuleDefinition) -> List[re.Pattern[str]]:
+        if rule.term_patterns is None:
+            rule.term_patterns = [
+                _compile_term_pattern(term, rule.case_sensitive, rule.word_boundary)
+                for term in rule.terms
+                if term
+            ]
+        return rule.term_patterns
+
+    def _find_term_matches(
+        self,
+        text: str,
+        rule: RuleDefinition,
+        patterns: Sequence[re.Pattern[str]],
+    ) -> List[_Candidate]:
+        found: list[_Candidate] = []
+        for pattern in patterns:
+            for match in pattern.finditer(text):
                 found.append(
                     _Candidate(
                         start=match.start(),
@@ -370,35 +727,6 @@ class RuleEngine:
                         rule=rule,
                     )
                 )
-        except re.error:
-            return []
-        return found
-
-    def _find_term_matches(self, text: str, rule: RuleDefinition) -> List[_Candidate]:
-        flags = 0 if rule.case_sensitive else re.IGNORECASE
-        found: list[_Candidate] = []
-        for term in rule.terms:
-            if not term:
-                continue
-            escaped = re.escape(term)
-            if rule.word_boundary:
-                start_boundary = r"\b" if re.match(r"\w", term[0]) else ""
-                end_boundary = r"\b" if re.match(r"\w", term[-1]) else ""
-                pattern = rf"{start_boundary}{escaped}{end_boundary}"
-            else:
-                pattern = escaped
-            try:
-                for match in re.finditer(pattern, text, flags):
-                    found.append(
-                        _Candidate(
-                            start=match.start(),
-                            end=match.end(),
-                            value=match.group(0),
-                            rule=rule,
-                        )
-                    )
-            except re.error:
-                continue
         return found
 
     def _resolve_overlaps(self, candidates: Sequence[_Candidate]) -> List[_Candidate]:
@@ -408,73 +736,85 @@ class RuleEngine:
         )
 
         accepted: list[_Candidate] = []
-        occupied: list[Tuple[int, int]] = []
+        last_start = last_end = -1
 
         for candidate in ordered:
-            overlaps = False
-            for start, end in occupied:
-                if candidate.start < end and start < candidate.end:
-                    overlaps = True
-                    break
-            if overlaps:
+            if candidate.start < last_end and (candidate.end > candidate.start or last_start < candidate.start):
                 continue
             accepted.append(candidate)
-            occupied.append((candidate.start, candidate.end))
+            if candidate.end > last_end:
+                last_start, last_end = candidate.start, candidate.end
 
         return accepted
 
-    def _apply_action(self, session_id: str, rule: RuleDefinition, value: str) -> Tuple[str, bool]:
-        action = rule.action.lower().strip()
-        if action == "replace":
-            replacement = rule.replacement or f"[{rule.category}]"
-            return replacement, False
-        if action == "anagram":
-            return deterministic_anagram(value, self._settings.token_secret), False
-        if action == "simple_encrypt":
-            return simple_encrypt(value, self._settings.token_secret), False
-        if action == "tokenize":
-            token, created = self._get_or_create_token(session_id, value, rule.category)
-            return token, created
-        return value, False
-
-    def _get_or_create_token(self, session_id: str, value: str, category: str) -> Tuple[str, bool]:
-        normalized_category = self._normalize_category(category)
-        value_hash = hash_text(f"{normalized_category}|{value.casefold().strip()}")
-
-        row = self._db.fetchone(
-            "SELECT token FROM token_mappings WHERE session_id = ? AND value_hash = ? AND category = ?",
-            (session_id, value_hash, normalized_category),
-        )
-        if row is not None:
-            return row["token"], False
+    def _apply_action(self, rule: RuleDefinition, value: str) -> str:
+        handler = self._action_handlers.get(rule.action)
+        return value if handler is None else handler(rule, value)
 
-        row_count = self._db.fetchone(
-            "SELECT COUNT(*) AS count FROM token_mappings WHERE session_id = ? AND category = ?",
-            (session_id, normalized_category),
-        )
-        next_index = (row_count or {"count": 0})["count"] + 1
-        token = f"<TKN_{normalized_category}_{next_index:03d}>"
-
-        now = datetime.now(timezone.utc)
-        expires = now + timedelta(days=self._settings.token_ttl_days)
-        self._db.execute(
-            """
-            INSERT INTO token_mappings (
-                id, session_id, token, value_hash, original_value_enc, category, created_at, expires_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                str(uuid.uuid4()),
-                session_id,
-                token,
-                value_hash,
-                encrypt_value(value, self._settings.token_secret),
-                normalized_category,
-                now.isoformat(),
-                expires.isoformat(),
-            ),
-        )
-        return token, True
+    @staticmethod
+    def _token_key(value: str, category: str) -> Tuple[str, str]:
+        normalized_category = RuleEngine._normalize_category(category)
+        return hash_text(f"{normalized_category}|{value.casefold().strip()}"), normalized_category
+
+    def _select_tokens(self, session_id: str, keys: Sequence[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+        wanted = set(keys)
+        hashes = list(dict.fromkeys(value_hash for value_hash, _ in keys))
+        found: Dict[Tuple[str, str], str] = {}
+        for offset in range(0, len(hashes), _TOKEN_LOOKUP_BATCH_SIZE):
+            batch = hashes[offset : offset + _TOKEN_LOOKUP_BATCH_SIZE]
+            query = _SELECT_TOKENS_BY_VALUE_SQL.format(placeholders=",".join("?" * len(batch)))
+            for row in self._db.fetchall(query, (session_id, *batch)):
+                key = (row["value_hash"], row["category"])
+                if key in wanted:
+                    found[key] = row["token"]
+        return found
+
+    def _get_or_create_tokens(
+        self, session_id: str, pending: Dict[Tuple[str, str], str]
+    ) -> Tuple[Dict[Tuple[str, str], str], int]:
+        tokens = self._select_tokens(session_id, list(pending))
+        missing = [key for key in pending if key not in tokens]
+        if not missing:
+            return tokens, 0
+
+        with self._db.transaction():
+            tokens.update(self._select_tokens(session_id, missing))
+            missing = [key for key in missing if key not in tokens]
+            if not missing:
+                return tokens, 0
+
+            categories = list(dict.fromkeys(category for _, category in missing))
+            counts = {
+                row["category"]: row["count"]
+                for row in self._db.fetchall(
+                    _COUNT_CATEGORY_TOKENS_SQL.format(placeholders=",".join("?" * len(categories))),
+                    (session_id, *categories),
+                )
+            }
+
+            now = datetime.now(timezone.utc)
+            created_at = now.isoformat()
+            expires_at = (now + timedelta(days=self._settings.token_ttl_days)).isoformat()
+            rows: list[tuple[Any, ...]] = []
+            for key in missing:
+                value_hash, category = key
+                counts[category] = counts.get(category, 0) + 1
+                token = f"<TKN_{category}_{counts[category]:03d}>"
+                tokens[key] = token
+                rows.append(
+                    (
+                        new_id(),
+                        session_id,
+                        token,
+                        value_hash,
+                        encrypt_value(pending[key], self._settings.token_secret),
+                        category,
+                        created_at,
+                        expires_at,
+                    )
+                )
+            self._db.execute_many(_INSERT_TOKEN_MAPPING_SQL, rows)
+        return tokens, len(missing)
 
     @staticmethod
     def _normalize_category(category: str) -> str:
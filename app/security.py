@@ -2,7 +2,15 @@ from __future__ import annotations
 
 import base64
 import hashlib
+import hmac
+import os
 import random
+from functools import lru_cache
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+_AEAD_PREFIX = "gcm1:"
+_AEAD_NONCE_SIZE = 12
 
 
 def hash_text(value: str) -> str:
@@ -10,29 +18,52 @@ def hash_text(value: str) -> str:
 
 
 def _xor_bytes(data: bytes, key: bytes) -> bytes:
-    out = bytearray()
-    key_len = len(key)
-    for idx, byte in enumerate(data):
-        out.append(byte ^ key[idx % key_len])
-    return bytes(out)
+    size = len(data)
+    if not size:
+        return b""
+    stream = (key * (size // len(key) + 1))[:size]
+    mixed = int.from_bytes(data, "big") ^ int.from_bytes(stream, "big")
+    return mixed.to_bytes(size, "big")
+
+
+@lru_cache(maxsize=8)
+def _derive_key(secret: str) -> bytes:
+    return hashlib.sha256(secret.encode("utf-8")).digest()
+
+
+@lru_cache(maxsize=8)
+def _aead(secret: str) -> AESGCM:
+    return AESGCM(_derive_key(secret)[:16])
+
+
+def _seal(data: bytes, nonce: bytes, secret: str) -> str:
+    encrypted = _aead(secret).encrypt(nonce, data, None)
+    return _AEAD_PREFIX + base64.urlsafe_b64encode(nonce + encrypted).decode("ascii")
 
 
 def encrypt_value(plain_text: str, secret: str) -> str:
-    raw = plain_text.encode("utf-8")
-    key = hashlib.sha256(secret.encode("utf-8")).digest()
-    encrypted = _xor_bytes(raw, key)
-    return base64.urlsafe_b64encode(encrypted).decode("ascii")
+    return _seal(plain_text.encode("utf-8"), os.urandom(_AEAD_NONCE_SIZE), secret)
+
+
+def encrypt_value_deterministic(plain_text: str, secret: str) -> str:
+    data = plain_text.encode("utf-8")
+    nonce = hmac.new(_derive_key(secret)[16:], data, hashlib.sha256).digest()[:_AEAD_NONCE_SIZE]
+    return _seal(data, nonce, secret)
 
 
 def decrypt_value(cipher_text: str, secret: str) -> str:
+    if cipher_text.startswith(_AEAD_PREFIX):
+        raw = base64.urlsafe_b64decode(cipher_text[len(_AEAD_PREFIX) :].encode("ascii"))
+        nonce, encrypted = raw[:_AEAD_NONCE_SIZE], raw[_AEAD_NONCE_SIZE:]
+        return _aead(secret).decrypt(nonce, encrypted, None).decode("utf-8")
     raw = base64.urlsafe_b64decode(cipher_text.encode("ascii"))
-    key = hashlib.sha256(secret.encode("utf-8")).digest()
+    key = _derive_key(secret)
     decrypted = _xor_bytes(raw, key)
     return decrypted.decode("utf-8")
 
 
 def simple_encrypt(value: str, secret: str) -> str:
-    encrypted = encrypt_value(value, secret)
+    encrypted = encrypt_value_deterministic(value, secret)
     return f"ENC[{encrypted}]"
 
 
@@ -1,17 +1,18 @@
 from __future__ import annotations
 
+from functools import lru_cache
 from pathlib import Path
 
 
 DEFAULT_APP_VERSION = "0.2.0"
+VERSION_FILE = Path(__file__).resolve().parents[1] / "VERSION"
 
 
+@lru_cache(maxsize=1)
 def get_app_version() -> str:
-    root_dir = Path(__file__).resolve().parents[1]
-    version_file = root_dir / "VERSION"
-    if not version_file.exists():
+    if not VERSION_FILE.exists():
         return DEFAULT_APP_VERSION
-    value = version_file.read_text(encoding="utf-8").strip()
+    value = VERSION_FILE.read_text(encoding="utf-8").strip()
     return value or DEFAULT_APP_VERSION
 
 
@@ -3,14 +3,33 @@ from __future__ import annotations
 import shutil
 import sys
 from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple
 
 import pytest
+from fastapi import FastAPI
 from fastapi.testclient import TestClient
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT_DIR))
 
 from app.main import create_app
+from app.rule_engine import RuleEngine
+
+_APP_FIXTURES = ("client", "client_no_logging")
+NOTES_TXT = b"Cliente Demo su progetto riservato"
+_APP_TABLES = ("audit_events", "chat_messages", "uploaded_files", "chat_sessions")
+
+_DEFAULT_RANDOMLY_SEED = 0
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config: pytest.Config) -> None:
+    if getattr(config.option, "randomly_seed", None) == "default":
+        config.option.randomly_seed = _DEFAULT_RANDOMLY_SEED
+
+
+def _fake_chat(messages: List[Dict[str, str]], model: str) -> Tuple[str, Dict[str, Any]]:
+    return "Fake response", {"provider": "fake", "model": model, "completion_tokens": 0, "prompt_tokens": 0}
 
 
 def _copy_default_rules(target_rules_dir: Path) -> None:
@@ -20,35 +39,78 @@ def _copy_default_rules(target_rules_dir: Path) -> None:
     shutil.copytree(source, target_rules_dir)
 
 
-@pytest.fixture()
-def client(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> TestClient:
-    data_dir = tmp_path / "data"
-    rules_dir = tmp_path / "rules"
+def _build_app(base_dir: Path, logging_enabled: bool) -> FastAPI:
+    data_dir = base_dir / "data"
+    rules_dir = base_dir / "rules"
     _copy_default_rules(rules_dir)
 
-    monkeypatch.setenv("DATA_DIR", str(data_dir))
-    monkeypatch.setenv("RULES_DIR", str(rules_dir))
-    monkeypatch.setenv("DB_PATH", str(data_dir / "app.db"))
-    monkeypatch.setenv("LOGGING_ENABLED", "true")
-    monkeypatch.setenv("OPENAI_API_KEY", "")
-    monkeypatch.setenv("AVAILABLE_MODELS", "gpt-4o-mini,gpt-5.2,gpt-5.3")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("DATA_DIR", str(data_dir))
+        monkeypatch.setenv("RULES_DIR", str(rules_dir))
+        monkeypatch.setenv("DB_PATH", str(data_dir / "app.db"))
+        monkeypatch.setenv("LOGGING_ENABLED", "true" if logging_enabled else "false")
+        monkeypatch.setenv("OPENAI_API_KEY", "")
+        monkeypatch.setenv("AVAILABLE_MODELS", "gpt-4o-mini,gpt-5.2,gpt-5.3")
+        app = create_app(base_dir=ROOT_DIR)
+    app.state.llm_gateway.chat = _fake_chat
+    return app
+
+
+def _reset_app(app: FastAPI) -> None:
+    app.state.rule_engine.clear_all_tokens()
+    db = app.state.db
+    with db.transaction():
+        for table in _APP_TABLES:
+            db.execute(f"DELETE FROM {table}")
+
+    uploads_dir = app.state.settings.uploads_dir
+    for path in uploads_dir.iterdir():
+        if path.is_dir():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
 
-    app = create_app(base_dir=ROOT_DIR)
-    return TestClient(app)
+
+@pytest.fixture(scope="session")
+def client(tmp_path_factory: pytest.TempPathFactory) -> Iterator[TestClient]:
+    app = _build_app(tmp_path_factory.mktemp("client"), logging_enabled=True)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def client_no_logging(tmp_path_factory: pytest.TempPathFactory) -> Iterator[TestClient]:
+    app = _build_app(tmp_path_factory.mktemp("client_no_logging"), logging_enabled=False)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="module")
+def rule_engine(client: TestClient) -> RuleEngine:
+    return client.app.state.rule_engine
+
+
+@pytest.fixture(autouse=True)
+def _isolate_app_state(request: pytest.FixtureRequest) -> Iterator[None]:
+    yield
+    for name in _APP_FIXTURES:
+        if name in request.fixturenames:
+            _reset_app(request.getfixturevalue(name).app)
 
 
 @pytest.fixture()
-def client_no_logging(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> TestClient:
-    data_dir = tmp_path / "data"
-    rules_dir = tmp_path / "rules"
-    _copy_default_rules(rules_dir)
+def override_llm(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> Callable[[Callable[..., Any]], None]:
+    def _override(chat: Callable[..., Any]) -> None:
+        monkeypatch.setattr(client.app.state.llm_gateway, "chat", chat)
 
-    monkeypatch.setenv("DATA_DIR", str(data_dir))
-    monkeypatch.setenv("RULES_DIR", str(rules_dir))
-    monkeypatch.setenv("DB_PATH", str(data_dir / "app.db"))
-    monkeypatch.setenv("LOGGING_ENABLED", "false")
-    monkeypatch.setenv("OPENAI_API_KEY", "")
-    monkeypatch.setenv("AVAILABLE_MODELS", "gpt-4o-mini,gpt-5.2,gpt-5.3")
+    return _override
 
-    app = create_app(base_dir=ROOT_DIR)
-    return TestClient(app)
+
+@pytest.fixture()
+def uploaded_text_file(client: TestClient) -> str:
+    response = client.post(
+        "/api/files/upload",
+        files={"file": ("notes.txt", NOTES_TXT, "text/plain")},
+    )
+    assert response.status_code == 200
+    return response.json()["id"]
@@ -1,26 +1,23 @@
 from __future__ import annotations
 
-from io import BytesIO
+import pytest
 
 from app.llm_gateway import LLMGatewayError
 
+BRIEF_TXT = b"Base contract content"
+BRIEF_MD = b"Contenuto base"
+CUSTOM_CLIENTS_TXT = b"New Client\nClient Alpha"
 
-def test_chat_upload_and_audit_flow(client):
+
+def test_chat_upload_and_audit_flow(client, uploaded_text_file):
     create_session = client.post("/api/chat/sessions", json={"title": "E2E"})
     assert create_session.status_code == 200
     session = create_session.json()
 
-    upload = client.post(
-        "/api/files/upload",
-        files={"file": ("notes.txt", BytesIO(b"Cliente Demo su progetto riservato"), "text/plain")},
-    )
-    assert upload.status_code == 200
-    uploaded = upload.json()
-
     message_payload = {
         "message": "Contatta ACME S.p.A. via mario.rossi@example.com",
         "model": "gpt-5.2",
-        "file_ids": [uploaded["id"]],
+        "file_ids": [uploaded_text_file],
     }
     send = client.post(f"/api/chat/sessions/{session['id']}/messages", json=message_payload)
     assert send.status_code == 200
@@ -47,18 +44,27 @@ def test_delete_chat_session(client):
     assert created.status_code == 200
     session_id = created.json()["id"]
 
+    send = client.post(
+        f"/api/chat/sessions/{session_id}/messages",
+        json={"message": "Contatta mario.rossi@example.com", "model": "gpt-5.2"},
+    )
+    assert send.status_code == 200
+
+    db = client.app.state.db
+    session_tables = ("chat_messages", "token_mappings", "audit_events")
+    for table in session_tables:
+        assert db.fetchone(f"SELECT 1 FROM {table} WHERE session_id = ? LIMIT 1", (session_id,)) is not None
+
     delete_response = client.delete(f"/api/chat/sessions/{session_id}")
     assert delete_response.status_code == 200
     assert delete_response.json()["ok"] is True
 
-    messages_after_delete = client.get(f"/api/chat/sessions/{session_id}/messages")
-    assert messages_after_delete.status_code == 404
-
-    sessions = client.get("/api/chat/sessions")
-    assert sessions.status_code == 200
-    assert all(item["id"] != session_id for item in sessions.json())
+    assert db.fetchone("SELECT id FROM chat_sessions WHERE id = ?", (session_id,)) is None
+    for table in session_tables:
+        assert db.fetchone(f"SELECT 1 FROM {table} WHERE session_id = ? LIMIT 1", (session_id,)) is None
 
 
+@pytest.mark.smoke
 def test_session_title_auto_renamed_after_first_prompt(client):
     create_session = client.post("/api/chat/sessions", json={"title": "New chat"})
     assert create_session.status_code == 200
@@ -76,14 +82,23 @@ def test_session_title_auto_renamed_after_first_prompt(client):
     assert current["title"] == "Contract - Enel"
 
 
-def test_same_as_input_generates_downloadable_file(client):
+@pytest.mark.parametrize(
+    ("source_name", "source_type", "source_body", "response_mode", "extension", "content_type"),
+    [
+        ("brief.txt", "text/plain", BRIEF_TXT, "same_as_input", ".txt", "text/plain"),
+        ("brief.md", "text/markdown", BRIEF_MD, "csv", ".csv", "text/csv"),
+    ],
+)
+def test_output_mode_generates_downloadable_file(
+    client, source_name, source_type, source_body, response_mode, extension, content_type
+):
     create_session = client.post("/api/chat/sessions", json={"title": "OutputFile"})
     assert create_session.status_code == 200
     session_id = create_session.json()["id"]
 
     upload = client.post(
         "/api/files/upload",
-        files={"file": ("brief.txt", BytesIO(b"Base contract content"), "text/plain")},
+        files={"file": (source_name, source_body, source_type)},
     )
     assert upload.status_code == 200
     source_file_id = upload.json()["id"]
@@ -94,53 +109,21 @@ def test_same_as_input_generates_downloadable_file(client):
             "message": "Prepare a structured response",
             "model": "gpt-5.2",
             "file_ids": [source_file_id],
-            "response_mode": "same_as_input",
+            "response_mode": response_mode,
         },
     )
     assert send.status_code == 200
     payload = send.json()
     generated = payload["generated_file"]
     assert generated is not None
-    assert generated["filename"].endswith(".txt")
-    assert generated["mode"] == "same_as_input"
+    assert generated["filename"].endswith(extension)
+    assert generated["mode"] == response_mode
     assert generated["source_file_id"] == source_file_id
 
     download = client.get(generated["download_url"])
     assert download.status_code == 200
     assert len(download.content) > 0
-
-
-def test_forced_output_format_csv_generates_csv_file(client):
-    create_session = client.post("/api/chat/sessions", json={"title": "ForcedCSV"})
-    assert create_session.status_code == 200
-    session_id = create_session.json()["id"]
-
-    upload = client.post(
-        "/api/files/upload",
-        files={"file": ("brief.md", BytesIO(b"Contenuto base"), "text/markdown")},
-    )
-    assert upload.status_code == 200
-    source_file_id = upload.json()["id"]
-
-    send = client.post(
-        f"/api/chat/sessions/{session_id}/messages",
-        json={
-            "message": "Genera output tabellare",
-            "model": "gpt-5.2",
-            "file_ids": [source_file_id],
-            "response_mode": "csv",
-        },
-    )
-    assert send.status_code == 200
-    payload = send.json()
-    generated = payload["generated_file"]
-    assert generated is not None
-    assert generated["filename"].endswith(".csv")
-    assert generated["mode"] == "csv"
-
-    download = client.get(generated["download_url"])
-    assert download.status_code == 200
-    assert download.headers.get("content-type", "").startswith("text/csv")
+    assert download.headers.get("content-type", "").startswith(content_type)
 
 
 def test_output_mode_without_file_falls_back_to_chat(client):
@@ -163,13 +146,14 @@ def test_output_mode_without_file_falls_back_to_chat(client):
     assert payload["sanitization"]["response_mode"] == "chat"
 
 
+@pytest.mark.smoke
 def test_rule_file_management_and_reload(client):
     files_before = client.get("/api/rules/files?subdir=lists")
     assert files_before.status_code == 200
 
     upload = client.post(
         "/api/rules/files?subdir=lists&overwrite=false",
-        files={"file": ("custom_clients.txt", BytesIO(b"New Client\nClient Alpha"), "text/plain")},
+        files={"file": ("custom_clients.txt", CUSTOM_CLIENTS_TXT, "text/plain")},
     )
     assert upload.status_code == 200
     file_id = upload.json()["file_id"]
@@ -191,12 +175,55 @@ def test_rule_file_management_and_reload(client):
     assert delete_result.status_code == 200
     assert delete_result.json()["ok"] is True
 
+    reload_after_delete = client.post("/api/rules/reload")
+    assert reload_after_delete.status_code == 200
+    assert reload_after_delete.json()["ok"] is True
+
+
+def test_upload_rejects_oversize_file(client, monkeypatch):
+    monkeypatch.setattr(client.app.state.settings, "max_upload_mb", 0)
+    response = client.post("/api/files/upload", files={"file": ("big.txt", BRIEF_TXT, "text/plain")})
+    assert response.status_code == 400
+    assert "limit" in response.json()["detail"]
+    assert list(client.app.state.settings.uploads_dir.iterdir()) == []
+
+
+def test_upload_rejects_empty_file(client):
+    response = client.post("/api/files/upload", files={"file": ("empty.txt", b"", "text/plain")})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Empty file"
+    assert list(client.app.state.settings.uploads_dir.iterdir()) == []
+
 
+def test_rule_file_upload_replaces_partial_file(client):
+    lists_dir = client.app.state.settings.rules_dir / "lists"
+    upload = client.post(
+        "/api/rules/files?subdir=lists&overwrite=false",
+        files={"file": ("partial_clients.txt", CUSTOM_CLIENTS_TXT, "text/plain")},
+    )
+    assert upload.status_code == 200
+    try:
+        assert (lists_dir / "partial_clients.txt").read_bytes() == CUSTOM_CLIENTS_TXT
+        assert not (lists_dir / "partial_clients.txt.part").exists()
+
+        (lists_dir / "stale.txt.part").write_bytes(b"leftover")
+        listed = client.get("/api/rules/files?subdir=lists")
+        assert listed.status_code == 200
+        names = {item["name"] for item in listed.json()}
+        assert "partial_clients.txt" in names
+        assert not any(name.endswith(".part") for name in names)
+    finally:
+        (lists_dir / "stale.txt.part").unlink(missing_ok=True)
+        client.delete(f"/api/rules/files/{upload.json()['file_id']}")
+
+
+@pytest.mark.smoke
 def test_rules_file_browser_blocks_path_traversal(client):
     response = client.get("/api/rules/files?subdir=../outside")
     assert response.status_code == 400
 
 
+@pytest.mark.e2e_slow
 def test_logging_disabled_mode(client_no_logging):
     session = client_no_logging.post("/api/chat/sessions", json={"title": "NoLog"}).json()
 
@@ -213,13 +240,14 @@ def test_logging_disabled_mode(client_no_logging):
     assert no_audit.status_code == 404
 
 
-def test_provider_599_is_exposed_as_502(client, monkeypatch):
+@pytest.mark.e2e_slow
+def test_provider_599_is_exposed_as_502(client, override_llm):
     session = client.post("/api/chat/sessions", json={"title": "ProviderError"}).json()
 
     def _raise_provider_error(messages, model):
         raise LLMGatewayError(message="HTTP 599 upstream timeout", upstream_status=599)
 
-    monkeypatch.setattr(client.app.state.llm_gateway, "chat", _raise_provider_error)
+    override_llm(_raise_provider_error)
 
     send = client.post(
         f"/api/chat/sessions/{session['id']}/messages",
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import sqlite3
+
+import pytest
+
+from app import db as db_module
+from app.db import SCHEMA_VERSION, Database
+
+_INSERT_SESSION_SQL = "INSERT INTO chat_sessions (id, title, created_at) VALUES (?, ?, ?)"
+_SELECT_SESSION_IDS_SQL = "SELECT id FROM chat_sessions ORDER BY id"
+_AUDIT_DETAILS = {"rules": ["email_regex"], "count": 2}
+
+
+def _insert_audit_sql(details_placeholder: str) -> str:
+    return (
+        "INSERT INTO audit_events (id, created_at, session_id, message_id, correlation_id, rules_triggered_json, "
+        "transformations, tokens_created, tokens_reconciled, original_hash, details_json) "
+        f"VALUES (?, '2026-01-01', 's1', 'm1', 'c1', '[]', 0, 0, 0, 'hash', {details_placeholder})"
+    )
+
+
+def _read_audit_details(db: Database, event_id: str) -> object:
+    row = db.fetchone(f"SELECT {db_module.json_column('details_json')} FROM audit_events WHERE id = ?", (event_id,))
+    return Database.from_json(row["details_json"], None)
+
+
+def _session_ids(db: Database) -> list[str]:
+    return [row["id"] for row in db.fetchall(_SELECT_SESSION_IDS_SQL)]
+
+
+def test_transaction_rolls_back_every_write_on_error(tmp_path):
+    db = Database(tmp_path / "app.db")
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.execute(_INSERT_SESSION_SQL, ("s1", "First", "2026-01-01"))
+            db.execute(_INSERT_SESSION_SQL, ("s2", "Second", "2026-01-01"))
+            raise RuntimeError("boom")
+
+    assert _session_ids(db) == []
+    db.close()
+
+
+def test_nested_transaction_joins_the_outer_one(tmp_path):
+    db = Database(tmp_path / "app.db")
+
+    with db.transaction():
+        db.execute(_INSERT_SESSION_SQL, ("s1", "Outer", "2026-01-01"))
+        with db.transaction():
+            db.execute(_INSERT_SESSION_SQL, ("s2", "Inner", "2026-01-01"))
+        assert _session_ids(db) == ["s1", "s2"]
+        with sqlite3.connect(tmp_path / "app.db") as observer:
+            assert observer.execute(_SELECT_SESSION_IDS_SQL).fetchall() == []
+    assert _session_ids(db) == ["s1", "s2"]
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.execute(_INSERT_SESSION_SQL, ("s3", "Outer", "2026-01-01"))
+            with db.transaction():
+                db.execute(_INSERT_SESSION_SQL, ("s4", "Inner", "2026-01-01"))
+            raise RuntimeError("boom")
+
+    assert _session_ids(db) == ["s1", "s2"]
+    db.close()
+
+
+def test_failed_commit_rolls_back_and_frees_the_writer(tmp_path):
+    db = Database(tmp_path / "app.db")
+    db.execute("PRAGMA foreign_keys = ON")
+
+    with pytest.raises(sqlite3.IntegrityError):
+        with db.transaction():
+            db.execute("PRAGMA defer_foreign_keys = ON")
+            db.execute(_INSERT_SESSION_SQL, ("s1", "Lost", "2026-01-01"))
+            db.execute(
+                "INSERT INTO chat_messages (id, session_id, role, content, sanitized_content, created_at) "
+                "VALUES ('m1', 'missing', 'user', 'hi', 'hi', '2026-01-01')"
+            )
+
+    with db.transaction():
+        db.execute(_INSERT_SESSION_SQL, ("s2", "Kept", "2026-01-01"))
+    assert _session_ids(db) == ["s2"]
+    assert db.fetchall("SELECT id FROM chat_messages") == []
+    db.close()
+
+
+def test_reopening_a_current_database_skips_schema_setup(tmp_path):
+    db_path = tmp_path / "app.db"
+    db = Database(db_path)
+    assert db.fetchone("PRAGMA user_version")["user_version"] == SCHEMA_VERSION
+    db.execute("DROP INDEX idx_chat_messages_session_created")
+    db.close()
+
+    reopened = Database(db_path)
+    assert reopened.fetchone("PRAGMA user_version")["user_version"] == SCHEMA_VERSION
+    index = reopened.fetchone(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND name = 'idx_chat_messages_session_created'"
+    )
+    assert index is None
+    reopened.close()
+
+
+def test_jsonb_reads_return_legacy_text_rows(tmp_path, monkeypatch):
+    db = Database(tmp_path / "app.db")
+    db.execute(_insert_audit_sql("?"), ("legacy", Database.to_json(_AUDIT_DETAILS)))
+
+    monkeypatch.setattr(db_module, "JSONB_SUPPORTED", True)
+    assert _read_audit_details(db, "legacy") == _AUDIT_DETAILS
+    db.close()
+
+
+@pytest.mark.skipif(sqlite3.sqlite_version_info < (3, 45, 0), reason="jsonb() needs SQLite 3.45 or newer")
+def test_jsonb_round_trip_alongside_text_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_module, "JSONB_SUPPORTED", True)
+    db = Database(tmp_path / "app.db")
+    db.execute(_insert_audit_sql("?"), ("legacy", Database.to_json(_AUDIT_DETAILS)))
+    db.execute(_insert_audit_sql(db_module.json_param()), ("binary", Database.to_json(_AUDIT_DETAILS)))
+
+    stored = db.fetchone("SELECT typeof(details_json) AS kind FROM audit_events WHERE id = 'binary'")
+    assert stored["kind"] == "blob"
+    assert _read_audit_details(db, "binary") == _AUDIT_DETAILS
+    assert _read_audit_details(db, "legacy") == _AUDIT_DETAILS
+    db.close()
@@ -1,50 +1,101 @@
 from __future__ import annotations
 
+import dataclasses
+import json
+import random
 import re
+from pathlib import Path
+from typing import Any, Dict, List
 
+import pytest
 
-def test_tokenize_consistency_same_value(client):
-    engine = client.app.state.rule_engine
+from app import rule_engine as rule_engine_module
+from app.db import Database
+from app.rule_engine import RuleDefinition, RuleEngine, _Candidate
 
+TOKEN_RE = re.compile(r"<TKN_[A-Z0-9_]+_[0-9]{3}>")
+EQUIVALENCE_TERMS = [
+    "Acme", "Acme Corp", "Corp", "C++", "-Beta", "x", "Straße", "İzmir", "ıi", "ſun", "Σίσυφος", "café", "K9",
+    "a_b",
+]
+EQUIVALENCE_FILLERS = ["", " ", "_", "x", "-", ".", "9", "İ", "ı", "ſ", "ß", "\u212a", "ς", "é", "\u0390"]
+
+RE2_SAFE_PATTERNS = [
+    ("email", r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b", False),
+    ("phone", r"\b(?:\+?\d{1,3}[\s.-]?)?(?:\(?\d{2,4}\)?[\s.-]?)?\d{3,4}[\s.-]?\d{3,4}\b", False),
+    ("work_order", r"\bwork\s+order\s+\w+", False),
+    ("code", r"[A-Z]{2}\d{2}", True),
+    ("optional", r"(?:ab)*c?", False),
+]
+RE2_REFUSED_PATTERNS = [
+    ("anchored", r"end$", False),
+    ("posix_like", r"key[:=]\d+", False),
+    ("open_quantifier", r"x{,3}y", False),
+]
+RE2_TEXT_PIECES = [
+    "mario.rossi@example.com", "+39 333 1234567", "work order A1", "WORK\tORDER b", "work\x0border c", "AB12",
+    "ab12", "abab", "key:12", "end", "xxy", " ", "\n", "\x0b", "\x1c", "\u00a0", "é", "ß", "_", "-", ".",
+]
+
+
+def _build_engine(client, base_dir: Path, ruleset: Dict[str, Any], lists: Dict[str, List[str]]) -> RuleEngine:
+    rules_dir = base_dir / "rules"
+    (rules_dir / "lists").mkdir(parents=True)
+    for name, terms in lists.items():
+        (rules_dir / "lists" / name).write_text("\n".join(terms), encoding="utf-8")
+    ruleset_file = rules_dir / "ruleset.json"
+    ruleset_file.write_text(json.dumps(ruleset), encoding="utf-8")
+    settings = dataclasses.replace(client.app.state.settings, rules_dir=rules_dir, ruleset_file=ruleset_file)
+    return RuleEngine(settings, Database(base_dir / "app.db"))
+
+
+def _random_text(rng: random.Random, terms: List[str]) -> str:
+    pieces = []
+    for _ in range(rng.randint(1, 12)):
+        if rng.random() < 0.5:
+            term = rng.choice(terms)
+            pieces.append(rng.choice([term, term.lower(), term.upper(), term.swapcase()]))
+        else:
+            pieces.append(rng.choice(EQUIVALENCE_FILLERS))
+    return "".join(pieces)
+
+
+def test_tokenize_consistency_same_value(rule_engine):
     text = "Contact mario.rossi@example.com and then again mario.rossi@example.com"
-    result = engine.sanitize("session-1", text)
+    result = rule_engine.sanitize("session-1", text)
 
-    tokens = re.findall(r"<TKN_[A-Z0-9_]+_[0-9]{3}>", result.sanitized_text)
+    tokens = TOKEN_RE.findall(result.sanitized_text)
     assert len(tokens) == 2
     assert tokens[0] == tokens[1]
     assert result.tokens_created == 1
 
 
-def test_business_terms_reconcile_allowed(client):
-    engine = client.app.state.rule_engine
-
+def test_business_terms_reconcile_allowed(rule_engine):
     text = "Client Enel requests support"
-    result = engine.sanitize("session-2", text)
+    result = rule_engine.sanitize("session-2", text)
 
-    token_match = re.search(r"<TKN_[A-Z0-9_]+_[0-9]{3}>", result.sanitized_text)
+    token_match = TOKEN_RE.search(result.sanitized_text)
     assert token_match is not None
 
     token = token_match.group(0)
-    reconciled, replaced, missing = engine.reconcile("session-2", f"Result for {token}")
+    reconciled, replaced, missing, _ = rule_engine.reconcile("session-2", f"Result for {token}")
 
     assert "Enel" in reconciled
     assert replaced >= 1
     assert missing == []
 
 
-def test_pii_reconcile_follows_policy(client):
-    engine = client.app.state.rule_engine
-
+def test_pii_reconcile_follows_policy(rule_engine):
     text = "Sensitive email: privacy@example.com"
-    result = engine.sanitize("session-3", text)
+    result = rule_engine.sanitize("session-3", text)
 
-    token_match = re.search(r"<TKN_[A-Z0-9_]+_[0-9]{3}>", result.sanitized_text)
+    token_match = TOKEN_RE.search(result.sanitized_text)
     assert token_match is not None
 
     token = token_match.group(0)
-    reconciled, replaced, _ = engine.reconcile("session-3", f"Echo {token}")
+    reconciled, replaced, _, _ = rule_engine.reconcile("session-3", f"Echo {token}")
 
-    if "PII" in engine.never_reconcile_categories:
+    if "PII" in rule_engine.never_reconcile_categories:
         assert token in reconciled
         assert replaced == 0
     else:
@@ -52,12 +103,172 @@ def test_pii_reconcile_follows_policy(client):
         assert replaced >= 1
 
 
-def test_names_list_supports_reversed_word_order(client):
-    engine = client.app.state.rule_engine
-
+def test_names_list_supports_reversed_word_order(rule_engine):
     text = "Meeting with Rossi Marco and Emily Davis."
-    result = engine.sanitize("session-4", text)
+    result = rule_engine.sanitize("session-4", text)
 
-    tokens = re.findall(r"<TKN_[A-Z0-9_]+_[0-9]{3}>", result.sanitized_text)
+    tokens = TOKEN_RE.findall(result.sanitized_text)
     assert len(tokens) == 2
     assert result.transformations >= 2
+
+
+def test_list_terms_respect_word_boundaries(rule_engine):
+    result = rule_engine.sanitize("session-5", "Enelx and xEnel are not Enel, but ENEL is.")
+
+    tokens = TOKEN_RE.findall(result.sanitized_text)
+    assert len(tokens) == 2
+    assert "Enelx and xEnel" in result.sanitized_text
+
+
+def test_repeated_sanitize_reuses_tokens(rule_engine):
+    text = "Write to anna.bianchi@example.com about the renewal"
+    first = rule_engine.sanitize("session-6", text)
+    second = rule_engine.sanitize("session-6", text)
+
+    assert second.sanitized_text == first.sanitized_text
+    assert first.tokens_created == 1
+    assert second.tokens_created == 0
+
+    rule_engine.reload()
+    third = rule_engine.sanitize("session-6", text)
+    assert third.sanitized_text == first.sanitized_text
+    assert third.tokens_created == 0
+
+
+def test_sanitize_cache_stays_within_total_char_budget(rule_engine, monkeypatch):
+    monkeypatch.setattr("app.rule_engine._SANITIZE_CACHE_MAX_TOTAL_CHARS", 200)
+    for index in range(10):
+        rule_engine.sanitize("session-7", f"Message number {index} about the renewal")
+
+    assert rule_engine._sanitize_cache_chars <= 200
+    assert rule_engine._sanitize_cache_chars == sum(
+        len(result.original_text) + len(result.sanitized_text) for result in rule_engine._sanitize_cache.values()
+    )
+    assert 0 < len(rule_engine._sanitize_cache) < 10
+
+
+def test_simple_encrypt_action_is_deterministic(rule_engine):
+    rule = RuleDefinition(id="secret_regex", rule_type="regex", category="SECRET", action="simple_encrypt")
+    first = rule_engine._apply_action(rule, "mario.rossi@example.com")
+
+    assert first.startswith("ENC[")
+    assert first == rule_engine._apply_action(rule, "mario.rossi@example.com")
+
+
+@pytest.mark.skipif(rule_engine_module.ahocorasick is None, reason="pyahocorasick is not installed")
+@pytest.mark.parametrize("case_sensitive", [False, True])
+@pytest.mark.parametrize("word_boundary", [True, False])
+def test_list_automaton_matches_regex_fallback(client, tmp_path, monkeypatch, case_sensitive, word_boundary):
+    ruleset = {
+        "rules": [],
+        "lists": [
+            {
+                "id": "terms",
+                "source": "lists/terms.txt",
+                "category": "LIST",
+                "case_sensitive": case_sensitive,
+                "word_boundary": word_boundary,
+            }
+        ],
+    }
+    lists = {"terms.txt": EQUIVALENCE_TERMS}
+    automaton_engine = _build_engine(client, tmp_path / "automaton", ruleset, lists)
+    monkeypatch.setattr(rule_engine_module, "ahocorasick", None)
+    regex_engine = _build_engine(client, tmp_path / "regex", ruleset, lists)
+    assert automaton_engine._state.rules[0].term_automaton is not None
+    assert regex_engine._state.rules[0].term_automaton is None
+
+    rng = random.Random(0)
+    for index in range(1000):
+        text = _random_text(rng, EQUIVALENCE_TERMS)
+        expected = regex_engine.sanitize(f"s{index}", text)
+        assert automaton_engine.sanitize(f"s{index}", text).sanitized_text == expected.sanitized_text, text
+
+
+def _regex_ruleset(patterns) -> Dict[str, Any]:
+    return {
+        "rules": [
+            {"id": name, "type": "regex", "pattern": pattern, "category": "CODE", "case_sensitive": case_sensitive}
+            for name, pattern, case_sensitive in patterns
+        ]
+    }
+
+
+@pytest.mark.skipif(rule_engine_module.re2 is None, reason="google-re2 is not installed")
+def test_re2_refuses_patterns_with_different_semantics(client, tmp_path):
+    engine = _build_engine(client, tmp_path, _regex_ruleset(RE2_SAFE_PATTERNS + RE2_REFUSED_PATTERNS), {})
+    re2_rules = {rule.id: rule.re2_pattern is not None for rule in engine._state.rules}
+
+    assert re2_rules == {name: name not in {"anchored", "posix_like", "open_quantifier"} for name in re2_rules}
+    assert rule_engine_module._is_re2_safe_text("work order A1")
+    for char in ("\x0b", "\x1c", "\u00a0", "é"):
+        assert not rule_engine_module._is_re2_safe_text(f"work order{char}A1")
+
+
+@pytest.mark.skipif(rule_engine_module.re2 is None, reason="google-re2 is not installed")
+def test_re2_matches_the_re_fallback(client, tmp_path, monkeypatch):
+    ruleset = _regex_ruleset(RE2_SAFE_PATTERNS + RE2_REFUSED_PATTERNS)
+    re2_engine = _build_engine(client, tmp_path / "re2", ruleset, {})
+    monkeypatch.setattr(rule_engine_module, "re2", None)
+    re_engine = _build_engine(client, tmp_path / "re", ruleset, {})
+
+    rng = random.Random(0)
+    for index in range(1000):
+        text = "".join(rng.choice(RE2_TEXT_PIECES) for _ in range(rng.randint(1, 8)))
+        re2_safe = rule_engine_module._is_re2_safe_text(text)
+        for rule, fallback_rule in zip(re2_engine._state.rules, re_engine._state.rules):
+            spans = [(item.start, item.end) for item in re2_engine._find_regex_matches(text, rule, 0, re2_safe)]
+            expected = [(item.start, item.end) for item in re_engine._find_regex_matches(text, fallback_rule)]
+            assert spans == expected, (rule.id, text)
+        expected_text = re_engine.sanitize(f"s{index}", text).sanitized_text
+        assert re2_engine.sanitize(f"s{index}", text).sanitized_text == expected_text, text
+
+
+def _candidate(start: int, end: int, rule_id: str = "a", priority: int = 100) -> _Candidate:
+    rule = RuleDefinition(id=rule_id, rule_type="regex", category="CODE", action="tokenize", priority=priority)
+    return _Candidate(start=start, end=end, value="x" * (end - start), rule=rule)
+
+
+def _selected(rule_engine, candidates: List[_Candidate]) -> List[tuple]:
+    return [(item.start, item.end, item.rule.id) for item in rule_engine._resolve_overlaps(candidates)]
+
+
+@pytest.mark.parametrize(
+    ("candidates", "expected"),
+    [
+        ([_candidate(0, 4, "a"), _candidate(0, 4, "b")], [(0, 4, "a")]),
+        ([_candidate(0, 4, "a"), _candidate(0, 4, "b", priority=120)], [(0, 4, "b")]),
+        ([_candidate(2, 6, "a"), _candidate(0, 4, "b")], [(0, 4, "b")]),
+        ([_candidate(0, 3, "a", priority=200), _candidate(0, 8, "b")], [(0, 8, "b")]),
+        ([_candidate(2, 4, "a", priority=200), _candidate(0, 8, "b")], [(0, 8, "b")]),
+        ([_candidate(0, 3, "a"), _candidate(3, 5, "b")], [(0, 3, "a"), (3, 5, "b")]),
+        ([_candidate(0, 0, "a"), _candidate(0, 4, "b")], [(0, 4, "b"), (0, 0, "a")]),
+        ([_candidate(2, 2, "a"), _candidate(0, 4, "b")], [(0, 4, "b")]),
+        ([_candidate(4, 4, "a"), _candidate(0, 4, "b")], [(0, 4, "b"), (4, 4, "a")]),
+        ([_candidate(1, 1, "a"), _candidate(1, 1, "b")], [(1, 1, "a"), (1, 1, "b")]),
+    ],
+)
+def test_resolve_overlaps_selection_order(rule_engine, candidates, expected):
+    assert _selected(rule_engine, candidates) == expected
+
+
+def _resolve_overlaps_reference(candidates: List[_Candidate]) -> List[_Candidate]:
+    ordered = sorted(candidates, key=lambda item: (item.start, -(item.end - item.start), -item.rule.priority))
+    accepted: List[_Candidate] = []
+    for candidate in ordered:
+        if any(candidate.start < item.end and item.start < candidate.end for item in accepted):
+            continue
+        accepted.append(candidate)
+    return accepted
+
+
+def test_resolve_overlaps_matches_pairwise_reference(rule_engine):
+    rng = random.Random(0)
+    for _ in range(2000):
+        candidates = []
+        for index in range(rng.randint(0, 8)):
+            start = rng.randint(0, 12)
+            end = start + rng.choice([0, 1, 2, 3, 5, 8])
+            candidates.append(_candidate(start, end, f"r{index}", priority=rng.choice([90, 100, 110])))
+        expected = [(item.start, item.end, item.rule.id) for item in _resolve_overlaps_reference(candidates)]
+        assert _selected(rule_engine, candidates) == expected
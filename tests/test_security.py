@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import base64
+
+from app.security import _derive_key, _xor_bytes, decrypt_value, encrypt_value, simple_encrypt
+
+
+def test_encrypted_values_round_trip():
+    cipher_text = encrypt_value("mario.rossi@example.com", "secret")
+
+    assert "mario" not in cipher_text
+    assert cipher_text != encrypt_value("mario.rossi@example.com", "secret")
+    assert decrypt_value(cipher_text, "secret") == "mario.rossi@example.com"
+
+
+def test_legacy_xor_values_still_decrypt():
+    legacy = base64.urlsafe_b64encode(_xor_bytes("Enel".encode("utf-8"), _derive_key("secret"))).decode("ascii")
+
+    assert decrypt_value(legacy, "secret") == "Enel"
+
+
+def test_simple_encrypt_is_deterministic():
+    first = simple_encrypt("mario.rossi@example.com", "secret")
+
+    assert first == simple_encrypt("mario.rossi@example.com", "secret")
+    assert first != simple_encrypt("anna.bianchi@example.com", "secret")
+    assert first != simple_encrypt("mario.rossi@example.com", "other-secret")
+    assert decrypt_value(first[len("ENC[") : -1], "secret") == "mario.rossi@example.com"